@@ -1,6 +1,29 @@
-from .encoder import encode
-from .decoder import decode
-from .header import header
-from .player import player
-from .repack import repack
-from .record import recorder
+import importlib, sys, types
+
+# Public classes and the modules they live in, imported on first access
+exports = {
+    'encode':   '.encoder',
+    'decode':   '.decoder',
+    'header':   '.header',
+    'player':   '.player',
+    'reader':   '.reader',
+    'repack':   '.repack',
+    'recorder': '.record',
+    'writer':   '.writer',
+    'stats':    '.tools.stats',
+}
+__all__ = list(exports)
+
+class package(types.ModuleType):
+    # Several classes share their module's name, the import system binding FrAD.header the module must not hide FrAD.header the class
+    def __getattr__(self, name: str):
+        if name not in exports: raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(exports[name], __name__), name)
+        types.ModuleType.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, name: str, value):
+        if name in exports and isinstance(value, types.ModuleType): return
+        types.ModuleType.__setattr__(self, name, value)
+
+sys.modules[__name__].__class__ = package
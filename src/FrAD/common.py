@@ -1,4 +1,4 @@
-import atexit, math, os, platform, subprocess, sys, tempfile, tarfile
+import atexit, importlib, math, os, platform, subprocess, sys, tempfile, threading
 
 yd = 365.25
 ys = yd * 86400
@@ -10,62 +10,83 @@ def terminal(*args: object, sep: str | None = ' ', end: str | None = '\n'):
     sys.stderr.buffer.write(f'{(sep or '').join(map(str,args))}{end}'.encode())
     sys.stderr.buffer.flush()
 
-class variables:
+class lazy(type):
+    # Class attributes resolved on first access and cached on the class, so importing costs nothing until a tool is needed
+    lock = threading.RLock()
+    def __getattr__(cls, name: str):
+        resolvers = type.__getattribute__(cls, 'resolvers')
+        if name not in resolvers: raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
+        with lazy.lock:
+            if name not in cls.__dict__: setattr(cls, name, resolvers[name]())
+        return cls.__dict__[name]
+
+class discover:
+    @staticmethod
+    def resource(name: str) -> str:
+        # Finding ffmpeg and ffprobe from src/FrAD/res, or from PATH
+        try: return os.path.join(res, [f for f in os.listdir(res) if name in f][0])
+        except: return name
+
+    @staticmethod
+    def aac() -> str | None:
+        # Setting up AppleAAC encoder for each platforms
+        system = platform.system()
+        if system == 'Windows':
+            AppleAAC_win = os.path.join(res, 'AppleAAC.Win.tar.gz')
+            aac = os.path.join(res, 'AppleAAC.Windows')
+            if os.path.isfile(AppleAAC_win) and not os.path.isfile(aac):
+                import tarfile
+                tarfile.open(AppleAAC_win, 'r:gz').extractall(path=res)
+        elif system == 'Darwin': aac = 'afconvert'
+        else: return None
+        return discover.verify(aac, '-h')
+
+    @staticmethod
+    def verify(tool: str, flag: str = '-version') -> str:
+        # Installation verification, once per tool on first use
+        try: subprocess.run([tool, flag], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            terminal('Error: ffmpeg or ffprobe not found. Please install and try again,')
+            terminal(f'or download and put them in {res}')
+            if platform.system() == 'Windows':  terminal('QAAC is built-in on this repository.')
+            elif platform.system() == 'Darwin': terminal('afconvert is built-in on macOS')
+            else:
+                terminal('On Linux, you have no way to use Apple AAC encoder.')
+                terminal('can anyone please reverse-engineer it and open its source')
+            sys.exit(1)
+        return tool
+
+    @staticmethod
+    def temp(suffix: str) -> str:
+        return tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix=suffix).name
+
+class variables(metaclass=lazy):
     FRM_SIGN = b'\xff\xd0\xd2\x97'
     FRM_MAXSZ = 2**32-1
     cli_width = 80
     overlap_rate = 16
 
-    crc16t_ansi = [(lambda c: [c := (c >> 1) ^ 0xA001 if c & 0x0001 else c >> 1 for _ in range(8)][-1])(i) for i in range(256)]
-
-    from .fourier import fourier
-    from .profiles.profile1 import p1
-
-    bit_depths = (
-        fourier.depths,
-        p1.depths
-    )
-
-    # Temporary files for metadata processing / stream repairing
-    temp =      tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.frad').name
-    temp2 =     tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.frad').name
-    # PCM -> FLAC -> AAC conversion for afconvert AppleAAC
-    temp_flac = tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.flac').name
-    # ffmeta
-    meta =      tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.meta').name
-
-    # Finding ffmpeg and ffprobe from src/FrAD/res
-    resfiles = lambda x: [f for f in os.listdir(res) if x in f]
-    try:    ffmpeg  = os.path.join(res, resfiles('ffmpeg')[0])
-    except: ffmpeg  = 'ffmpeg'
-    try:    ffprobe = os.path.join(res, resfiles('ffprobe')[0])
-    except: ffprobe = 'ffprobe'
-
-    # Setting up AppleAAC encoder for each platforms
-    oper = platform.uname()
-    arch = platform.machine().lower()
-    if oper.system == 'Windows':
-        AppleAAC_win = os.path.join(res, 'AppleAAC.Win.tar.gz')
-        aac = os.path.join(res, 'AppleAAC.Windows')
-        if os.path.isfile(AppleAAC_win) and not os.path.isfile(aac): tarfile.open(AppleAAC_win, 'r:gz').extractall(path=res)
-    elif oper.system == 'Darwin':  aac = 'afconvert'
-    else:                          aac = None
-
-    # ffmpeg and ffprobe installation verification
-    try:
-        subprocess.run([ffmpeg,  '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        subprocess.run([ffprobe, '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        if aac is not None:
-            subprocess.run([aac,       '-h'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except FileNotFoundError:
-        terminal('Error: ffmpeg or ffprobe not found. Please install and try again,')
-        terminal(f'or download and put them in {res}')
-        if oper.system == 'Windows':  terminal('QAAC is built-in on this repository.')
-        elif oper.system == 'Darwin': terminal('afconvert is built-in on macOS')
-        else:
-            terminal('On Linux, you have no way to use Apple AAC encoder.')
-            terminal('can anyone please reverse-engineer it and open its source')
-        sys.exit(1)
+    resolvers = {
+        # Codec modules, imported when first needed
+        'fourier':    lambda: importlib.import_module('.fourier', __package__).fourier,
+        'p1':         lambda: importlib.import_module('.profiles.profile1', __package__).p1,
+        'bit_depths': lambda: (variables.fourier.depths, variables.p1.depths),
+
+        # Temporary files for metadata processing / stream repairing
+        'temp':       lambda: discover.temp('.frad'),
+        'temp2':      lambda: discover.temp('.frad'),
+        # PCM -> FLAC -> AAC conversion for afconvert AppleAAC
+        'temp_flac':  lambda: discover.temp('.flac'),
+        # ffmeta
+        'meta':       lambda: discover.temp('.meta'),
+
+        # External tools, checked on first use
+        'ffmpeg':     lambda: discover.verify(discover.resource('ffmpeg')),
+        'ffprobe':    lambda: discover.verify(discover.resource('ffprobe')),
+        'aac':        discover.aac,
+        'oper':       platform.uname,
+        'arch':       lambda: platform.machine().lower(),
+    }
 
 class methods:
     @staticmethod
@@ -79,11 +100,10 @@ class methods:
         if sign in (b'fRad', b'\xff\xd0\xd2\x97'):
             raise Exception('This is an already encoded Fourier Analogue file.')
 
-    def crc16_ansi(data):
-        crc = 0
-        for byte in data:
-            crc = (crc >> 8) ^ variables.crc16t_ansi[(crc ^ byte) & 0xff]
-        return crc
+    @staticmethod
+    def crc16_ansi(data: bytes) -> int:
+        from .tools.crc import crc16
+        return crc16.ansi(data)
 
     @staticmethod
     def tformat(n: float | str) -> str: # i'm dying help
@@ -118,14 +138,11 @@ class methods:
 
     @atexit.register
     def cleanup():
-        temp_files = [
-            variables.temp,
-            variables.temp2,
-            variables.temp_flac,
-            variables.meta]
+        # Only the temporary files that were ever named
+        temp_files = [variables.__dict__.get(k) for k in ('temp', 'temp2', 'temp_flac', 'meta')]
 
         for file in temp_files:
-            if os.path.exists(file):
+            if file and os.path.exists(file):
                 try:os.remove(file)
                 except:pass
 
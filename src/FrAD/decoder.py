@@ -2,13 +2,16 @@ from .common import variables, methods, terminal
 from .fourier import fourier
 from .header import header
 import numpy as np
-import atexit, io, math, os, platform, shutil, struct,\
+import atexit, io, math, os, platform, struct,\
        subprocess, sys, tempfile, time, traceback, zlib
-import sounddevice as sd
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from .tools.crc import crc16
 from .tools.ecc import ecc
-from .tools.headb import headb
+from .tools.headb import headb, frameindex
+from .tools.stats import stats
+from .tools.sync import sync, mapped
 
-RM_CLI = '\x1b[1A\x1b[2K'
 
 class ASFH:
     def __init__(self): pass
@@ -70,29 +73,150 @@ class decode:
         return frame, prev
 
     @staticmethod
-    def write(frame: np.ndarray, playstream: sd.OutputStream, filestream: io.BufferedWriter, dtype: str, play: bool, ispipe: bool) -> None:
+    def trim(block: np.ndarray, pos: int, start: int, stop: int | float) -> np.ndarray:
+        # Part of a block at sample position pos that falls within [start, stop)
+        if start <= pos and pos + len(block) <= stop: return block
+        return block[max(start-pos, 0):max(stop-pos, 0)]
+
+    @staticmethod
+    def write(frame: np.ndarray, filestream: io.BufferedWriter, dtype: str, ispipe: bool) -> None:
         if frame.shape != np.array([]).shape:
-            if play: playstream.write(frame.astype(np.float32))
-            else:
-                dt, dp = methods.get_dtype(dtype)
-                if not dtype.startswith('f'):
-                    if dtype.startswith('u'): frame+=1
-                    frame *= 2**(dp*8-1)
-                if ispipe: sys.stdout.buffer.write(frame.astype(dt).tobytes())
-                else: filestream.write(frame.astype(dt).tobytes())
+            t = stats.start()
+            dt, dp = methods.get_dtype(dtype)
+            if not dtype.startswith('f'):
+                if dtype.startswith('u'): frame+=1
+                frame *= 2**(dp*8-1)
+            if ispipe: sys.stdout.buffer.write(frame.astype(dt).tobytes())
+            else: filestream.write(frame.astype(dt).tobytes())
+            stats.stop('write', t, frame.nbytes, 0)
         return None
 
+    @staticmethod
+    def frame(data: bytes | memoryview, asfh: ASFH, fix_error: bool, gain: float) -> np.ndarray:
+        # Everything but the overlap for a single frame, so it can run on a worker
+        # Decoding ECC
+        if asfh.ecc:
+            t, size = stats.start(), len(data)
+            if fix_error and ((asfh.profile == 0      and zlib.crc32(data)         != struct.unpack('>I', asfh.crc)[0])
+                or            (asfh.profile in [1, 2] and crc16.ansi(data) != struct.unpack('>H', asfh.crc)[0])
+                ): data = ecc.decode(data, asfh.ecc_dsize, asfh.ecc_codesize); stats.stop('ecc.decode', t, size, len(data))
+            else:  data = ecc.unecc( data, asfh.ecc_dsize, asfh.ecc_codesize); stats.stop(fix_error and 'ecc.check' or 'ecc.unecc', t, size, len(data))
+
+        # Decoding
+        t = stats.start()
+        pcm = fourier.digital(data, asfh.float_bits, asfh.chnl, asfh.endian, profile=asfh.profile, srate=asfh.srate, fsize=asfh.fsize) * gain
+        stats.stop('fourier.digital', t, len(data), pcm.nbytes)
+        return pcm
+
+    @staticmethod
+    def frames(f: io.BufferedReader, fix_error: bool, gain: float, pool: Executor | None = None, ahead: int = 0):
+        # Yields (ASFH, decoded frame) in stream order, keeping up to ahead frames in flight on the pool
+        pending: deque = deque()
+        for _ in sync.frames(f):
+            # Parsing ASFH & Reading Audio Stream Frame
+            t = stats.start()
+            asfh = ASFH()
+            asfh.update(f)
+            data: bytes | memoryview = f.read(asfh.frmbytes)
+            stats.stop('read', t, asfh.headlen+asfh.frmbytes, 0)
+
+            if pool is None: yield asfh, decode.frame(data, asfh, fix_error, gain); continue
+            # Worker processes cannot share the memory map
+            if isinstance(pool, ProcessPoolExecutor): data = bytes(data)
+            pending.append((asfh, pool.submit(decode.frame, data, asfh, fix_error, gain)))
+            if len(pending) > ahead:
+                asfh, future = pending.popleft()
+                yield asfh, future.result()
+        while pending:
+            asfh, future = pending.popleft()
+            yield asfh, future.result()
+
+    @staticmethod
+    def stream(file_path: str, **kwargs):
+        # Yields decoded PCM in [samples, channels] as (samples, srate, channels), one frame at a time
+        # The overlapping tail is held back until the next frame, or flushed before a sample rate or channel change
+        fix_error: bool = kwargs.get('ecc', False)
+        gain: float = kwargs.get('gain', 1)
+        use_mmap: bool = kwargs.get('mmap', False)
+        threads: int = kwargs.get('threads', 0)
+
+        with open(file_path, 'rb') as file, (use_mmap and mapped.open(file) or file) as f:
+            head = f.read(64)
+            ftype = methods.signature(head[0x0:0x4])
+            f.seek(ftype == 'container' and struct.unpack('>Q', head[0x8:0x10])[0] or 0)
+
+            pool = threads > 0 and ThreadPoolExecutor(threads) or None
+            try: yield from decode.blocks(f, fix_error, gain, pool, threads*2)
+            finally:
+                if pool: pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def blocks(f: io.BufferedReader, fix_error: bool, gain: float, pool: Executor | None = None, ahead: int = 0):
+        # decode.stream from the current position of an open file
+        prev, srate, channels = np.array([]), 0, 0
+        for asfh, frame in decode.frames(f, fix_error, gain, pool, ahead):
+            if (asfh.chnl, asfh.srate) != (channels, srate):
+                if len(prev): yield prev, srate, channels
+                prev, channels, srate = np.array([]), asfh.chnl, asfh.srate
+            frame, prev = decode.overlap(frame, prev, asfh)
+            if len(frame): yield frame, srate, channels
+        if len(prev): yield prev, srate, channels
+
+    @staticmethod
+    def scan(f: io.BufferedReader, head_len: int) -> frameindex:
+        # In-memory index of every frame, for files written without one
+        asfh = ASFH()
+        index = frameindex(capacity=2**32-2, base=head_len)
+        f.seek(head_len)
+        for offset in sync.frames(f):
+            asfh.update(f)
+            f.seek(asfh.frmbytes, 1)
+            index.add(offset, asfh.headlen+asfh.frmbytes, asfh.fsize, asfh.srate, asfh.chnl, asfh.profile == 1 and asfh.overlap or 0)
+        index.samples, index.tail = index.samples + index.tail, 0
+        index.timeline()
+        return index
+
+    @staticmethod
+    def locate(f: io.BufferedReader, head_len: int, index: frameindex, sample: int) -> tuple[int, int]:
+        # File offset and sample position to start decoding from for a sample position:
+        # the frame covering it, or its predecessor whose overlapping tail gets crossfaded into it
+        entry = index.locate_sample(sample, before=1)
+        if entry is None: return head_len, 0
+        f.seek(head_len + entry[1])
+        pos, tail, fmt = entry[2], 0, None
+        start = pred = (head_len + entry[1], pos)
+        asfh = ASFH()
+        # Walking the frame headers from one entry earlier, so the predecessor is always seen
+        for offset in sync.frames(f):
+            asfh.update(f)
+            f.seek(asfh.frmbytes, 1)
+            if (asfh.srate, asfh.chnl) != fmt:
+                if fmt is not None: pos += tail
+                tail = 0
+            if pos > sample: break
+            start, pred = tail and pred or (offset, pos), (offset, pos)
+            fmt = asfh.srate, asfh.chnl
+            tail = asfh.profile == 1 and asfh.overlap and -(-asfh.fsize//min(max(asfh.overlap, 2), 255)) or 0
+            pos += asfh.fsize - tail
+        return start
+
     @staticmethod
     def internal(file_path: str, **kwargs) -> None:
-        speed: float = kwargs.get('speed', 1)
-        play: bool = kwargs.get('play', False)
         ispipe: bool = kwargs.get('pipe', False)
         fix_error: bool = kwargs.get('ecc', False)
         gain: float = kwargs.get('gain', 1)
         verbose: bool = kwargs.get('verbose', False)
         dtype: str = kwargs.get('dtype', 'f64be')
+        use_mmap: bool = kwargs.get('mmap', False)
+        threads: int = kwargs.get('threads', 0)
+        processes: int = kwargs.get('processes', 0)
+        # Opens the output of each new sample rate and channel segment, temp files by default
+        sink = kwargs.get('sink', None)
+        # Time range in seconds, decoding only the frames covering it
+        start: float | None = kwargs.get('start', None)
+        end: float | None = kwargs.get('end', None)
         global filelist
-        with open(file_path, 'rb') as f:
+        with open(file_path, 'rb') as file, (use_mmap and mapped.open(file) or file) as f:
 
 # ------------------------------ Header verification ----------------------------- #
 # This block verifies the file signature and gets the total header size.
@@ -125,38 +249,44 @@ class decode:
 
             warned = False
             error_dir = []
-            fhead = None
-            while True:
+            # Duration and frame count from the frame index, if any and no integrity check is requested
+            index = head_len and headb.parse_index(file_path) or None
+            if index is not None and index.entries and not fix_error:
+                duration, framescount = index.duration, index.frames
+            else:
                 # Finding Audio Stream Frame Header(AFSH)
-                if fhead is None: fhead = f.read(4)
-                if fhead != variables.FRM_SIGN:
-                    hq = f.read(1)
-                    if not hq:
-                        if asfh.profile in [1, 2]: ddict[asfh.srate] += asfh.fsize//asfh.overlap
-                        break
-                    fhead = fhead[1:]+hq
-                    continue
-                asfh.update(f)
-                data = f.read(asfh.frmbytes)
-                if fix_error:
-                    if ((asfh.profile == 0 and zlib.crc32(data) != struct.unpack('>I', asfh.crc)[0])
-                    or (asfh.profile in [1, 2] and asfh.ecc and methods.crc16_ansi(data) != struct.unpack('>H', asfh.crc)[0])
-                    ):
-                        error_dir.append(str(framescount))
-                        if not warned: warned = True; terminal("This file may had been corrupted. Please repack your file via 'ecc' option for the best music experience.")
-
-                try: ddict[asfh.srate] += asfh.fsize
-                except: ddict[asfh.srate] = asfh.fsize
-                if asfh.profile in [1, 2] and asfh.overlap != 0: ddict[asfh.srate] -= asfh.fsize//asfh.overlap
-
-                dlen += asfh.frmbytes
-                framescount += 1
-                fhead = None
+                for _ in sync.frames(f):
+                    asfh.update(f)
+                    data = f.read(asfh.frmbytes)
+                    if fix_error:
+                        if ((asfh.profile == 0 and zlib.crc32(data) != struct.unpack('>I', asfh.crc)[0])
+                        or (asfh.profile in [1, 2] and asfh.ecc and crc16.ansi(data) != struct.unpack('>H', asfh.crc)[0])
+                        ):
+                            error_dir.append(str(framescount))
+                            if not warned: warned = True; terminal("This file may had been corrupted. Please repack your file via 'ecc' option for the best music experience.")
+
+                    try: ddict[asfh.srate] += asfh.fsize
+                    except: ddict[asfh.srate] = asfh.fsize
+                    if asfh.profile in [1, 2] and asfh.overlap != 0: ddict[asfh.srate] -= asfh.fsize//asfh.overlap
+
+                    dlen += asfh.frmbytes
+                    framescount += 1
+                if framescount and asfh.profile in [1, 2] and asfh.overlap != 0: ddict[asfh.srate] += asfh.fsize//asfh.overlap
+                duration = sum([ddict[k] / k for k in ddict])
 
             # show error frames
             if error_dir != []: terminal(f'Corrupt frames: {", ".join(error_dir)}')
-            duration = sum([ddict[k] / k for k in ddict]) / speed
+
+            # Sample range, starting from the frame covering it or its overlapping predecessor
+            pos, smpl_start, smpl_stop = 0, 0, math.inf
             f.seek(head_len)
+            if start is not None or end is not None:
+                if index is None or not index.entries: index = decode.scan(f, head_len)
+                smpl_start = start is not None and max(index.sample(start), 0) or 0
+                smpl_stop = index.samples if end is None else max(index.sample(end), smpl_start)
+                duration = min(duration if end is None else end, duration) - (start or 0)
+                offset, pos = decode.locate(f, head_len, index, smpl_start)
+                f.seek(offset)
 
 # ----------------------------------- Metadata ----------------------------------- #
 # This block parses and shows the metadata and image data from the header.
@@ -176,104 +306,63 @@ class decode:
 # This block decodes FrAD stream to PCM stream and writes it on stdout or a file.
 # ESSENTIAL
 
-            stdoutstrm = sd.OutputStream(channels=1)
             tempfstrm = open(os.devnull, 'wb')
+            # Frames are decoded on the pool and reassembled in order, overlap is applied here
+            pool: Executor | None = None
+            if processes > 0: pool = ProcessPoolExecutor(processes)
+            elif threads > 0: pool = ThreadPoolExecutor(threads)
+            workers = max(processes, threads)
             try:
                 # Starting stream
                 printed = False
-                bps = bpstot = 0
                 dlen = os.path.getsize(file_path) - head_len
                 start_time = time.time()
-                fhead, prev, frame = None, np.array([]), np.array([])
+                prev, frame = np.array([]), np.array([])
 
     # ----------------------------- Main decode loop ----------------------------- #
-                while True:
-                    # Finding Audio Stream Frame Header(AFSH)
-                    if fhead is None: fhead = f.read(4)
-                    if fhead != variables.FRM_SIGN:
-                        hq = f.read(1)
-                        if not hq: decode.write(prev, stdoutstrm, tempfstrm, dtype, play, ispipe); break
-                        fhead = fhead[1:]+hq
-                        continue
-
-                    # Parsing ASFH & Reading Audio Stream Frame
-                    asfh.update(f)
-                    data: bytes = f.read(asfh.frmbytes)
-
-                    # Decoding ECC
-                    if asfh.ecc:
-                        if fix_error and ((asfh.profile == 0      and zlib.crc32(data)         != struct.unpack('>I', asfh.crc)[0])
-                            or            (asfh.profile in [1, 2] and methods.crc16_ansi(data) != struct.unpack('>H', asfh.crc)[0])
-                            ): data = ecc.decode(data, asfh.ecc_dsize, asfh.ecc_codesize)
-                        else:  data = ecc.unecc( data, asfh.ecc_dsize, asfh.ecc_codesize)
-
-                    # Decoding
-                    frame: np.ndarray = fourier.digital(data, asfh.float_bits, asfh.chnl, asfh.endian, profile=asfh.profile, srate=asfh.srate, fsize=asfh.fsize) * gain
-
+                # Finding Audio Stream Frame Header(AFSH)
+                for asfh, frame in decode.frames(f, fix_error, gain, pool, workers*2):
                     # if channels and sample rate changed
                     if channels != asfh.chnl or srate != asfh.srate:
                         channels, srate = asfh.chnl, asfh.srate
-                        decode.write(prev, stdoutstrm, tempfstrm, dtype, play, ispipe)
-                        if play: stdoutstrm = sd.OutputStream(samplerate=int(asfh.srate*speed), channels=asfh.chnl); stdoutstrm.start()
+                        decode.write(decode.trim(prev, pos, smpl_start, smpl_stop), tempfstrm, dtype, ispipe)
+                        pos += len(prev)
+                        prev = np.array([])
+                        tempfstrm.close()
+                        if sink: tempfstrm = sink(srate, channels)
                         else:
-                            prev = np.array([])
-                            tempfstrm.close()
                             tempfstrm = open(tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.pcm').name, 'wb')
                             filelist.append([tempfstrm.name, channels, srate])
 
                     frame, prev = decode.overlap(frame, prev, asfh)
 
                     # Write PCM Stream
-                    decode.write(frame, stdoutstrm, tempfstrm, dtype, play, ispipe)
+                    frame, pos = decode.trim(frame, pos, smpl_start, smpl_stop), pos + len(frame)
+                    decode.write(frame, tempfstrm, dtype, ispipe)
 
 # --------------------------- Verbose block, Optional ---------------------------- #
 #
                     frameNo += 1
-                    try: t_accr[srate*speed] += len(frame)
-                    except: t_accr[srate*speed] = len(frame)
+                    try: t_accr[srate] += len(frame)
+                    except: t_accr[srate] = len(frame)
                     t_sec = sum([t_accr[k] / k for k in t_accr])
                     bytes_accr += asfh.frmbytes + asfh.headlen
-                    if play:
-                        bps = (((asfh.frmbytes+len(fhead)) * 8) * asfh.srate / len(frame))
-                        bpstot += bps
-                        depth = variables.bit_depths[asfh.profile][asfh.float_bits]
-                        lgs = int(math.log(asfh.srate, 1000))
-                        lgv = int(math.log(bpstot/frameNo, 1000))
-                        if verbose:
-                            if printed: terminal(RM_CLI*5, end='')
-                            terminal(f'{methods.tformat(t_sec)} / {methods.tformat(duration)} (Frame #{frameNo} / {framescount} Frame{(framescount!=1)*"s"})')
-                            terminal(f'{depth}b@{asfh.srate/10**(lgs*3)} {['','k','M','G','T'][lgs]}Hz {not asfh.endian and"B"or"L"}E {asfh.chnl} channel{(asfh.chnl!=1)*"s"}')
-                            lgf = int(math.log(bps, 1000))
-                            terminal(f'Profile {asfh.profile}, ECC{asfh.ecc and f": {asfh.ecc_dsize}/{asfh.ecc_codesize}" or " disabled"}{asfh.profile == 1 and f", Overlap: 1/{asfh.overlap}" or ""}')
-                            terminal(f'{len(frame)} sample{len(frame)!=1 and"s"or""}, {asfh.frmbytes} Byte{(asfh.frmbytes!=1)*"s"} per frame')
-                            terminal(f'{bps/10**(lgf*3):.3f} {['','k','M','G','T'][lgf]}bps per-frame, {bpstot/frameNo/10**(lgv*3):.3f} {['','k','M','G','T'][lgv]}bps average')
-                        else:
-                            if printed: terminal(RM_CLI, end='')
-                            cq = {1:'Mono',2:'Stereo',4:'Quad',6:'5.1 Surround',8:'7.1 Surround'}.get(asfh.chnl, f'{asfh.chnl} ch')
-                            terminal(f'{methods.tformat(t_sec)} / {methods.tformat(duration)}, {asfh.profile==0 and f"{depth}b@"or f"{bpstot/frameNo/10**(lgv*3):.3f} {['','k','M','G','T'][lgv]}bps "}{asfh.srate/10**(lgs*3)} {['','k','M','G','T'][lgs]}Hz {cq}')
-                        printed = True
-                    else:
-                        if verbose:
-                            elapsed_time = time.time() - start_time
-                            bps = bytes_accr / elapsed_time
-                            mult = t_sec / elapsed_time
-                            printed = methods.logging(3, 'Decode', printed, percent=(bytes_accr*100/dlen), bps=bps, mult=mult, time=elapsed_time)
+                    if verbose:
+                        elapsed_time = time.time() - start_time
+                        bps = bytes_accr / elapsed_time
+                        mult = t_sec / elapsed_time
+                        printed = methods.logging(3, 'Decode', printed, percent=(bytes_accr*100/dlen), bps=bps, mult=mult, time=elapsed_time)
 #
 # ------------------------------- End verbose block ------------------------------ #
-                    fhead = None
+                    if pos >= smpl_stop: break
 
-                stdoutstrm.stop()
-                stdoutstrm.close()
+                decode.write(decode.trim(prev, pos, smpl_start, smpl_stop), tempfstrm, dtype, ispipe)
+                if pool: pool.shutdown()
                 tempfstrm.close()
-                if printed and play:
-                    terminal(RM_CLI, end='')
-                    if verbose: terminal(RM_CLI*4, end='')
             except KeyboardInterrupt:
-                stdoutstrm.abort()
-                stdoutstrm.close()
+                if pool: pool.shutdown(wait=False, cancel_futures=True)
                 tempfstrm.close()
-                if not play:
-                    terminal('Aborting...')
+                terminal('Aborting...')
                 sys.exit(0)
 
     @staticmethod
@@ -295,7 +384,13 @@ class decode:
     ffmpeg_lossless = ['wav', 'flac', 'wavpack', 'tta', 'truehd', 'alac', 'dts', 'mlp']
 
     @staticmethod
-    def directcmd(temp_pcm, dtype, srate, channels, ffmpeg_cmd):
+    def run(command: list[str], stream: bool) -> subprocess.Popen | None:
+        # Streamed segments are started right away and fed through stdin while decoding
+        if stream: return subprocess.Popen(command, stdin=subprocess.PIPE)
+        subprocess.run(command)
+
+    @staticmethod
+    def directcmd(temp_pcm, dtype, srate, channels, ffmpeg_cmd, stream=False):
         command = [
             variables.ffmpeg, '-y',
             '-loglevel', 'error',
@@ -307,10 +402,10 @@ class decode:
         ]
         command.extend(['-map_metadata', '1', '-map', '0:a'])
         command.extend(ffmpeg_cmd)
-        subprocess.run(command)
+        return decode.run(command, stream)
 
     @staticmethod
-    def ffmpeg(temp_pcm, dtype, srate, channels, codec, f, s, out, ext, quality, strategy, new_srate):
+    def ffmpeg(temp_pcm, dtype, srate, channels, codec, f, s, out, ext, quality, strategy, new_srate, stream=False):
         command = [
             variables.ffmpeg, '-y',
             '-loglevel', 'error',
@@ -361,7 +456,7 @@ class decode:
 
         # File name
         command.append(f'{out}.{ext}')
-        subprocess.run(command)
+        return decode.run(command, stream)
 
     @staticmethod
     def AppleAAC_macOS(temp_pcm, dtype, srate, channels, out, quality, strategy):
@@ -400,7 +495,7 @@ class decode:
             sys.exit(0)
 
     @staticmethod
-    def AppleAAC_Windows(temp_pcm, dtype, srate, channels, out, quality, new_srate):
+    def AppleAAC_Windows(temp_pcm, dtype, srate, channels, out, quality, new_srate, stream=False):
         try:
             command = [
                 variables.aac,
@@ -416,7 +511,7 @@ class decode:
                 '-o', f'{out}.aac',
                 '-s'
             ])
-            subprocess.run(command)
+            return decode.run(command, stream)
         except KeyboardInterrupt:
             terminal('Aborting...')
             sys.exit(0)
@@ -444,10 +539,18 @@ class decode:
 
         # CLI
         verbose: bool = kwargs.get('verbose', False)
+        use_mmap: bool = kwargs.get('mmap', False)
+        threads: int = kwargs.get('threads', 0)
+        processes: int = kwargs.get('processes', 0)
 
-        # Decoding
-        decode.internal(file_path, ecc=ecc, gain=gain, pipe=(out=='pipe'and True or False), dtype=dtype, verbose=verbose)
-        if out == 'pipe': sys.exit(0)
+        # Time range in seconds
+        start: float | None = kwargs.get('start', None)
+        end: float | None = kwargs.get('end', None)
+
+        # Piping
+        if out == 'pipe':
+            decode.internal(file_path, ecc=ecc, gain=gain, pipe=True, dtype=dtype, verbose=verbose, mmap=use_mmap, threads=threads, processes=processes, start=start, end=end)
+            sys.exit(0)
         header.parse_to_ffmeta(file_path, variables.meta)
 
         try:
@@ -488,20 +591,40 @@ class decode:
                 f = s = 'u8'
             else: raise ValueError(f'Illegal value {bits} for bits: only 8, 16, and 32 bits are available for decoding.')
 
-            for z in range(len(filelist)):
-                temp_pcm, channels, srate = filelist[z]
-
-                if ffmpeg_cmd is not None:
-                    decode.directcmd(temp_pcm, dtype, srate, channels, ffmpeg_cmd)
+            # Each sample rate and channel segment is transcoded while decoding, with PCM fed through the encoder's stdin
+            segments: list[subprocess.Popen | None] = []
+            afconvert: list[tuple[int, str, int, int]] = []
+            def segment(srate: int, channels: int) -> io.BufferedWriter:
+                nonlocal q
+                z = len(segments)
+                if ffmpeg_cmd is not None: process = decode.directcmd('pipe:0', dtype, srate, channels, ffmpeg_cmd, stream=True)
+                elif (codec == 'aac' and srate <= 48000 and channels <= 2) or codec in ['appleaac', 'apple_aac']:
+                    if strategy in ['c', 'a']: q = decode.setaacq(q, channels)
+                    # afconvert can only read files, so macOS still goes through a temp file
+                    if platform.system() == 'Darwin':
+                        strm = open(tempfile.NamedTemporaryFile(prefix='frad_', delete=True, suffix='.pcm').name, 'wb')
+                        filelist.append([strm.name, channels, srate])
+                        afconvert.append((z, strm.name, srate, channels))
+                        segments.append(None)
+                        return strm
+                    elif platform.system() == 'Windows': process = decode.AppleAAC_Windows('-', dtype, srate, channels, (z==0 and out or f'{out}.{z}'), q, new_srate, stream=True)
+                    else: process = None
+                elif codec not in ['pcm', 'raw']:
+                    process = decode.ffmpeg('pipe:0', dtype, srate, channels, codec, f, s, (z==0 and out or f'{out}.{z}'), ext, q, strategy, new_srate, stream=True)
                 else:
-                    if (codec == 'aac' and srate <= 48000 and channels <= 2) or codec in ['appleaac', 'apple_aac']:
-                        if strategy in ['c', 'a']: q = decode.setaacq(q, channels)
-                        if platform.system() == 'Darwin': decode.AppleAAC_macOS(temp_pcm, dtype, srate, channels, (z==0 and out or f'{out}.{z}'), q, strategy)
-                        elif platform.system() == 'Windows': decode.AppleAAC_Windows(temp_pcm, dtype, srate, channels, (z==0 and out or f'{out}.{z}'), q, new_srate)
-                    elif codec not in ['pcm', 'raw']:
-                        decode.ffmpeg(temp_pcm, dtype, srate, channels, codec, f, s, (z==0 and out or f'{out}.{z}'), ext, q, strategy, new_srate)
-                    else:
-                        shutil.move(temp_pcm, (z==0 and f'{out}.{ext}' or f'{out}.{z}.{ext}'))
+                    segments.append(None)
+                    return open((z==0 and f'{out}.{ext}' or f'{out}.{z}.{ext}'), 'wb')
+                segments.append(process)
+                return process and process.stdin or open(os.devnull, 'wb')
+
+            # Decoding
+            decode.internal(file_path, ecc=ecc, gain=gain, dtype=dtype, verbose=verbose, mmap=use_mmap, threads=threads, processes=processes, start=start, end=end, sink=segment)
+            for process in segments:
+                if process: process.wait()
+
+            # Segments left in temp files
+            for z, temp_pcm, srate, channels in afconvert:
+                decode.AppleAAC_macOS(temp_pcm, dtype, srate, channels, (z==0 and out or f'{out}.{z}'), q, strategy)
                 os.remove(temp_pcm)
 
         except KeyboardInterrupt: terminal('Aborting...')
@@ -1,11 +1,19 @@
 from .common import variables, methods, terminal
 from .fourier import fourier
-import io, json, os, math, random, struct, subprocess, sys, time, traceback, zlib
+import io, json, os, math, queue, random, struct, subprocess, sys, threading, time, traceback, zlib
 import numpy as np
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from .tools.crc import crc16
+from .tools.stats import stats
 from .tools.ecc import ecc
-from .tools.headb import headb
+from .tools.headb import headb, frameindex
 
 class encode:
+    # ffprobe results by (path, size, mtime)
+    probes: dict[tuple[str, int, int], dict] = {}
+    probe_lock = threading.Lock()
+
     @staticmethod
     def overlap(data: np.ndarray, prev: np.ndarray, olap: int, profile: int) -> tuple[np.ndarray, np.ndarray]:
         fsize = len(data) + len(prev)
@@ -15,6 +23,17 @@ class encode:
         else: prev = np.array([])
         return data, prev
 
+    @staticmethod
+    def overlap_rate(overlap: int | float | None) -> int:
+        # Overlap as 1/N of a frame, ratios of 0.5 or below taken as the fraction itself
+        if not isinstance(overlap, (int, float)): overlap = variables.overlap_rate
+        elif overlap <= 0: overlap = 0
+        elif overlap <= 0.5: overlap = int(1/overlap)
+        elif overlap < 2: overlap = 2
+        elif overlap > 255: overlap = 255
+        if overlap%1!=0: overlap = int(overlap)
+        return overlap
+
     @staticmethod
     def write_frame(file: io.BufferedWriter, frame: bytes, chnl: int, srate: int, pfb: bytes, ecc_list: tuple[int, int], fsize: int, **kwargs) -> None:
         profile, isecc, _, _ = headb.decode_pfb(pfb)
@@ -43,31 +62,103 @@ class encode:
                 data += (
                     struct.pack('>B', ecc_list[0]) +
                     struct.pack('>B', ecc_list[1]) +
-                    struct.pack('>H', methods.crc16_ansi(frame))
+                    struct.pack('>H', crc16.ansi(frame))
                 )
         if len(frame) >= variables.FRM_MAXSZ: data += struct.pack('>Q', len(frame))
         data += frame
+        index: frameindex | None = kwargs.get('index', None)
+        if index is not None:
+            if profile == 1: fsize = min((x for x in variables.p1.smpls_li if x >= fsize), default=fsize)
+            index.add(file.tell(), len(data), fsize, srate, chnl, profile == 1 and kwargs.get('olap', 0) or 0)
+        t = stats.start()
         file.write(data)
+        stats.stop('write', t, 0, len(data))
         return None
 
     @staticmethod
-    def get_info(file_path) -> tuple[int, int, str, int]:
+    def reader(stdout: io.BufferedReader, chunks: queue.Queue, channels: int, gain: float, fsize: int, overlap: int, profile: int, batch: int) -> None:
+        # Reading PCM and cutting it into frames ahead of the encoders, None at the end of stream
+        prev = np.array([])
+        try:
+            while True:
+                # Getting required read length
+                rlen = fsize
+                if profile == 1:
+                    rlen = min((x-len(prev) for x in variables.p1.smpls_li if x >= fsize))
+                    if rlen <= 0: rlen = min((x-len(prev) for x in variables.p1.smpls_li if x-len(prev) >= fsize))
+
+                t = stats.start()
+                data = stdout.read(rlen * 8 * channels * batch) # Reading PCM
+                stats.stop('ffmpeg.read', t, 0, len(data))
+                if not data: break                               # if no data, Break
+
+                # RAW PCM to Numpy
+                pcm = np.frombuffer(data, '>f8').astype(float).reshape(-1, channels) * gain
+                frames = []
+                for i in range(0, len(pcm), rlen):
+                    frame, prev = encode.overlap(pcm[i:i+rlen], prev, overlap, profile)
+                    frames.append(frame)
+                chunks.put((frames, len(pcm)))
+        except Exception as e: chunks.put(e)
+        chunks.put(None)
+
+    @staticmethod
+    def frames(frames: list[np.ndarray], bits: int, channels: int, little_endian: bool, profile: int, srate: int, loss_level: int, workers: int | None, ecc_sizes: tuple[int, int] | None, compression: str | None = None) -> list[tuple[bytes, int, int, int, int]]:
+        # Transform, quantisation, entropy coding and ECC of a chunk of frames, run by the encode workers
+        encoded = []
+        t = stats.start()
+        analogue = fourier.analogue_batch(frames, bits, channels, little_endian, profile=profile, srate=srate, level=loss_level, workers=workers, compression=compression)
+        stats.stop('fourier.analogue', t, sum(f.nbytes for f in frames), sum(len(a[0]) for a in analogue))
+        for flen, (frame, bit_depth_frame, channels_frame, bits_pfb) in zip(map(len, frames), analogue):
+
+            # Applying ECC
+            if ecc_sizes:
+                t = stats.start()
+                frame, size = ecc.encode(frame, *ecc_sizes), len(frame)
+                stats.stop('ecc.encode', t, size, len(frame))
+            encoded.append((frame, bit_depth_frame, channels_frame, bits_pfb, flen))
+        return encoded
+
+    @staticmethod
+    def probe(file_path: str) -> dict:
+        # Stream info, tags and cover art presence from a single ffprobe run, cached by path, size and modification time
+        st = os.stat(file_path)
+        key = (os.path.realpath(file_path), st.st_size, st.st_mtime_ns)
+        with encode.probe_lock:
+            if key in encode.probes: return encode.probes[key]
+
         command = [variables.ffprobe,
             '-v', 'quiet',
             '-print_format', 'json',
             '-show_streams',
+            '-show_format',
             file_path
         ]
         result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
         info = json.loads(result.stdout)
 
-        for stream in info['streams']:
-            if stream['codec_type'] == 'audio':
-                tbase = stream['time_base'].split('/')
-                duration = stream['duration_ts'] * int(stream['sample_rate']) // int(tbase[1]) * int(tbase[0])
-                return int(stream['channels']), int(stream['sample_rate']), stream['codec_name'], duration
-        terminal('No audio stream found.')
-        sys.exit(1)
+        audio = next((stream for stream in info.get('streams', []) if stream['codec_type'] == 'audio'), None)
+        if audio is None:
+            terminal('No audio stream found.')
+            sys.exit(1)
+        tbase = audio['time_base'].split('/')
+        duration = audio['duration_ts'] * int(audio['sample_rate']) // int(tbase[1]) * int(tbase[0])
+
+        # Container tags, or the audio stream's for formats keeping them there
+        excluded = ['major_brand', 'minor_version', 'compatible_brands', 'encoder']
+        tags = info.get('format', {}).get('tags') or audio.get('tags', {})
+        probe = {
+            'channels': int(audio['channels']), 'srate': int(audio['sample_rate']), 'codec': audio['codec_name'], 'duration': duration,
+            'meta': [[k, v] for k, v in tags.items() if k not in excluded],
+            'image': any(stream.get('disposition', {}).get('attached_pic') for stream in info.get('streams', [])),
+        }
+        with encode.probe_lock: encode.probes[key] = probe
+        return probe
+
+    @staticmethod
+    def get_info(file_path) -> tuple[int, int, str, int]:
+        probe = encode.probe(file_path)
+        return probe['channels'], probe['srate'], probe['codec'], probe['duration']
 
     @staticmethod
     def get_pcm_command(file_path: str, raw: tuple[str, int | None, int | None], srate: int | None, chnl: int | None) -> list[str]:
@@ -94,48 +185,22 @@ class encode:
 
     @staticmethod
     def get_metadata(file_path: str):
-        excluded = ['major_brand', 'minor_version', 'compatible_brands', 'encoder']
-        command = [
-            variables.ffmpeg, '-v', 'quiet', '-y',
-            '-i', file_path,
-            '-f', 'ffmetadata',
-            variables.meta
-        ]
-        subprocess.run(command)
-        with open(variables.meta, 'r', encoding='utf-8') as m:
-            meta = m.read()
-        metadata_lines = meta.split('\n')[1:]
-        metadata = []
-        current_key = None
-        current_value = []
-
-        for line in metadata_lines:
-            if '=' in line:
-                if current_key:
-                    metadata.append([current_key, '\n'.join(current_value).replace('\n\\\n', '\n')])
-                current_key, value = line.split('=', 1)
-                if current_key in excluded:
-                    current_key = None
-                else:
-                    current_value = [value]
-            elif current_key:
-                current_value.append(line)
-
-        if current_key:
-            metadata.append([current_key, '\n'.join(current_value)])
-        os.remove(variables.meta)
-        return metadata
+        return [list(m) for m in encode.probe(file_path)['meta']]
 
     @staticmethod
     def get_image(file_path: str):
-        command = [
-            variables.ffmpeg, '-v', 'quiet', '-i', file_path,
-            '-an', '-vcodec', 'copy',
-            '-f', 'image2pipe', '-'
-        ]
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        image, _ = process.communicate()
-        return image
+        # ffmpeg only runs for sources the probe found cover art in
+        probe = encode.probe(file_path)
+        if not probe['image']: return b''
+        if 'cover' not in probe:
+            command = [
+                variables.ffmpeg, '-v', 'quiet', '-i', file_path,
+                '-an', '-vcodec', 'copy',
+                '-f', 'image2pipe', '-'
+            ]
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            probe['cover'], _ = process.communicate()
+        return probe['cover']
 
     @staticmethod
     def enc(file_path: str, bits: int, **kwargs):
@@ -144,6 +209,7 @@ class encode:
         little_endian: bool = kwargs.get('le', False)
         profile: int = kwargs.get('prf', 0)
         loss_level: int = kwargs.get('lv', 0)
+        compression: str | None = kwargs.get('comp', None) # Profile 1 compression method or preset
         overlap: int = kwargs.get('olap', variables.overlap_rate)
         gain: float = kwargs.get('gain', None)
 
@@ -165,6 +231,20 @@ class encode:
         meta: list[list[str]] = kwargs.get('meta', None)
         img: bytes = kwargs.get('img', None)
 
+        # Frame index, one entry per N frames
+        index_interval: int | None = kwargs.get('index', None)
+
+        # Header bytes reserved for editing metadata in place
+        padding: int = kwargs.get('padding', 0)
+
+        # Transform
+        batch: int = kwargs.get('batch', 8)
+        workers: int | None = kwargs.get('workers', None)
+
+        # Encoding chunks on N worker threads or processes, 0 to encode on the writer
+        threads: int = kwargs.get('threads', 0)
+        processes: int = kwargs.get('processes', 0)
+
         # CLI
         verbose: bool = kwargs.get('verbose', False)
         out: str = kwargs.get('out', None)
@@ -178,6 +258,8 @@ class encode:
         try: variables.bit_depths[profile].index(bits)
         except: terminal(f'Invalid bit depth {bits} for Profile {profile}'); sys.exit(1)
         if not 20 >= loss_level >= 0: terminal(f'Invalid compression level: {loss_level} Lossy compression level should be between 0 and 20.'); sys.exit(1)
+        try: variables.p1.method(compression)
+        except ValueError as e: terminal(e); sys.exit(1)
 
         segmax = {0: 2**32-1,
                     1: max(variables.p1.smpls_li)}
@@ -203,16 +285,14 @@ class encode:
             if not new_srate in variables.p1.srates: new_srate = 48000
             fsize = min((x for x in variables.p1.smpls_li if x >= fsize), default=2048)
 
+        # Profile 0 frames don't overlap, so several of them can be read and transformed at once
+        if profile != 0: batch = 1
+
         # Moulding FFmpeg command and initting read srates and channels
         cmd = encode.get_pcm_command(file_path, raw, new_srate, new_chnl)
         srate, channels = new_srate or srate, new_chnl or channels
 
-        if not isinstance(overlap, (int, float)): overlap = variables.overlap_rate
-        elif overlap <= 0: overlap = 0
-        elif overlap <= 0.5: overlap = int(1/overlap)
-        elif overlap < 2: overlap = 2
-        elif overlap > 255: overlap = 255
-        if overlap%1!=0: overlap = int(overlap)
+        overlap = encode.overlap_rate(overlap)
         # Setting file extension
         if out is None: out = os.path.basename(file_path).rsplit('.', 1)[0]
         if not out.lower().endswith(('.frad', '.dsin', '.fra', '.dsn')):
@@ -232,17 +312,32 @@ class encode:
                 if x == 'n': sys.exit('Aborted.')
 
 # ----------------------------------- Encoding ----------------------------------- #
+        pool: Executor | None = None
         try:
             start_time = time.time()
             total_bytes, total_samples = 0, 0
-            prev = np.array([])
 
             # Open FFmpeg
             process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
 
             printed = False
+            index = None
+            if index_interval:
+                # Reserving index capacity for the estimated frame count
+                spf = fsize - (profile == 1 and overlap and fsize//overlap or 0)
+                index = frameindex(capacity=max(int(duration/spf/index_interval)+16, 256), interval=index_interval)
+
             # Write file
-            open(out, 'wb').write(headb.uilder(meta, img))
+            open(out, 'wb').write(headb.uilder(meta, img, index, padding))
+            if process.stdout is None: raise FileNotFoundError('Broken pipe.')
+            if processes > 0: pool = ProcessPoolExecutor(processes)
+            elif threads > 0: pool = ThreadPoolExecutor(threads)
+            jobs = max(processes, threads)
+
+            # Reader thread -> worker pool -> ordered writer, up to 2N chunks in flight
+            chunks: queue.Queue = queue.Queue(maxsize=max(jobs, 1)*2)
+            threading.Thread(target=encode.reader, args=(process.stdout, chunks, channels, gain, fsize, overlap, profile, batch), daemon=True).start()
+            pending: deque = deque()
             with open(out, 'ab') as file:
                 while True:
                     # profile = random.randrange(2) # Random profile test
@@ -254,47 +349,42 @@ class encode:
                     # ecc_dsize = random.randrange(1, 255-ecc_codesize)
                     # overlap = random.choice(range(2, 256)) # Random overlap test
 
-                    # Getting required read length
-                    rlen = fsize
-                    if profile == 1:
-                        rlen = min((x-len(prev) for x in variables.p1.smpls_li if x >= fsize))
-                        if rlen <= 0: rlen = min((x-len(prev) for x in variables.p1.smpls_li if x-len(prev) >= fsize))
-
-                    if process.stdout is None: raise FileNotFoundError('Broken pipe.')
-                    data = process.stdout.read(rlen * 8 * channels) # Reading PCM
-                    if not data: break                        # if no data, Break
-
-                    # RAW PCM to Numpy
-                    frame = np.frombuffer(data, '>f8').astype(float).reshape(-1, channels) * gain
-                    rlen = len(frame)
-                    frame, prev = encode.overlap(frame, prev, overlap, profile)
-                    flen = len(frame)
-
-                    # Encoding
-                    frame, bit_depth_frame, channels_frame, bits_pfb = \
-                        fourier.analogue(frame, bits, channels, little_endian, profile=profile, srate=srate, level=loss_level)
-
-                    # Applying ECC
-                    if apply_ecc: frame = ecc.encode(frame, ecc_dsize, ecc_codesize)
-
-                    # EFloat Byte
-                    pfb = headb.encode_pfb(profile, apply_ecc, little_endian, bits_pfb)
-                    encode.write_frame(file, frame, channels_frame, srate, pfb, (ecc_dsize, ecc_codesize), flen, olap=overlap)
-
-                    # Verbose block
-                    if verbose:
-                        sample_size = bit_depth_frame // 8 * channels
-                        total_bytes += rlen * sample_size
-                        total_samples += rlen
-                        elapsed_time = time.time() - start_time
-                        bps = total_bytes / elapsed_time
-                        mult = bps / srate / sample_size
-                        printed = methods.logging(3, 'Encode', printed, percent=(total_samples/duration*100), bps=bps, mult=mult, time=elapsed_time)
-
+                    chunk = chunks.get()
+                    if isinstance(chunk, Exception): raise chunk
+                    if chunk is not None:
+                        frames, rlen = chunk
+                        job = (frames, bits, channels, little_endian, profile, srate, loss_level, workers, apply_ecc and (ecc_dsize, ecc_codesize) or None, compression)
+                        if pool: pending.append((rlen, pool.submit(encode.frames, *job)))
+                        else: pending.append((rlen, encode.frames(*job)))
+
+                    # Writing finished chunks in order
+                    while pending and (chunk is None or not pool or len(pending) > jobs):
+                        rlen, encoded = pending.popleft()
+                        if pool: encoded = encoded.result()
+                        for frame, bit_depth_frame, channels_frame, bits_pfb, flen in encoded:
+                            # EFloat Byte
+                            pfb = headb.encode_pfb(profile, apply_ecc, little_endian, bits_pfb)
+                            encode.write_frame(file, frame, channels_frame, srate, pfb, (ecc_dsize, ecc_codesize), flen, olap=overlap, index=index)
+
+                        # Verbose block
+                        if verbose:
+                            sample_size = bit_depth_frame // 8 * channels
+                            total_bytes += rlen * sample_size
+                            total_samples += rlen
+                            elapsed_time = time.time() - start_time
+                            bps = total_bytes / elapsed_time
+                            mult = bps / srate / sample_size
+                            printed = methods.logging(3, 'Encode', printed, percent=(total_samples/duration*100), bps=bps, mult=mult, time=elapsed_time)
+                    if chunk is None: break
+
+            if pool: pool.shutdown()
             process.terminate()
+            if index is not None: index.patch(out)
         except KeyboardInterrupt:
+            if pool: pool.shutdown(wait=False, cancel_futures=True)
             terminal('Aborting...')
             sys.exit(0)
         except Exception as e:
+            if pool: pool.shutdown(wait=False, cancel_futures=True)
             if verbose: terminal('\x1b[1A\x1b[2K\x1b[1A\x1b[2K\x1b[1A\x1b[2K', end='')
             sys.exit(traceback.format_exc())
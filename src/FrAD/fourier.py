@@ -1,6 +1,6 @@
-from scipy.fft import dct, idct
 import numpy as np
 from .profiles.profile1 import p1
+from .tools.transform import transform
 
 class fourier:
     depths = (12, 16, 24, 32, 48, 64, 128)
@@ -11,12 +11,26 @@ class fourier:
     def analogue(pcm: np.ndarray, bits: int, channels: int, little_endian: bool, *, profile: int = 0, **kwargs) -> tuple[bytes, int, int, int]:
         if profile == 1: return p1.analogue(pcm, bits, channels, **kwargs)
 
+        # DCT
+        return fourier.pack(transform.dct(pcm, **kwargs), bits, channels, little_endian)
+
+    @staticmethod
+    def analogue_batch(pcms: list[np.ndarray], bits: int, channels: int, little_endian: bool, *, profile: int = 0, **kwargs) -> list[tuple[bytes, int, int, int]]:
+        if profile == 1: return [p1.analogue(pcm, bits, channels, **kwargs) for pcm in pcms]
+
+        # DCT of every frame with the same length in one [frames, samples, channels] transform
+        freqs: list[np.ndarray] = [np.array([])] * len(pcms)
+        for flen in set(map(len, pcms)):
+            index = [i for i in range(len(pcms)) if len(pcms[i]) == flen]
+            for i, f in zip(index, transform.dct(np.stack([pcms[i] for i in index]), **kwargs)): freqs[i] = f
+
+        return [fourier.pack(f, bits, channels, little_endian) for f in freqs]
+
+    @staticmethod
+    def pack(freqs: np.ndarray, bits: int, channels: int, little_endian: bool) -> tuple[bytes, int, int, int]:
         be = not little_endian
         endian = be and '>' or '<'
 
-        # DCT
-        freqs = np.array([dct(pcm[:, i]) for i in range(channels)])
-
         # Overflow check & Increasing bit depth
         while np.max(np.abs(freqs)) > 2**(2**fourier.float_dr[bits]):
             if bits == 128: raise Exception('Overflow with reaching the max bit depth.')
@@ -24,24 +38,26 @@ class fourier:
 
         # Ravelling and packing
         if bits%8!=0: endian = '>'
-        frad: bytes = freqs.T.ravel().astype(endian+fourier.dtypes[bits]).tobytes()
+        frad: bytes = freqs.ravel().astype(endian+fourier.dtypes[bits]).tobytes()
 
         # Cutting off bits
         if bits in (128, 64, 32, 16):
             pass
         elif bits in (48, 24):
-            frad = b''.join([be and frad[i:i+(bits//8)] or frad[i+(bits//24):i+(bits//6)] for i in range(0, len(frad), bits//6)])
+            # Dropping the least significant mantissa bytes of each f8/f4
+            frad = np.frombuffer(frad, np.uint8).reshape(-1, bits//6)[:, be and slice(None, bits//8) or slice(bits//24, None)].tobytes()
         elif bits == 12:
-            hexa = frad.hex()
-            hexa = ''.join([hexa[i:i+3] for i in range(0, len(hexa), 4)])
-            if len(hexa)%2!=0: hexa+='0'
-            frad = bytes.fromhex(hexa)
+            # Upper 12 bits of each f2, two samples per three bytes
+            smpl = np.frombuffer(frad, '>u2') >> 4
+            pair = np.pad(smpl, (0, len(smpl)%2)).reshape(-1, 2)
+            frad = np.stack([pair[:, 0] >> 4, (pair[:, 0] & 0xf) << 4 | pair[:, 1] >> 8, pair[:, 1] & 0xff], axis=1).astype(np.uint8)
+            frad = frad.tobytes()[:(len(smpl)*3+1)//2]
         else: raise Exception('Illegal bits value.')
 
         return frad, bits, channels, fourier.depths.index(bits)
 
     @staticmethod
-    def digital(frad: bytes, fb: int, channels: int, little_endian: bool, *, profile: int = 0, **kwargs) -> np.ndarray:
+    def digital(frad: bytes | memoryview, fb: int, channels: int, little_endian: bool, *, profile: int = 0, **kwargs) -> np.ndarray:
         if profile == 1: return p1.digital(frad, fb, channels, **kwargs)
 
         be = not little_endian
@@ -51,19 +67,21 @@ class fourier:
         # Padding bits
         if bits % 3 != 0: pass
         elif bits in (24, 48):
-            frad = b''.join([be and frad[i:i+(bits//8)]+(b'\x00'*(bits//24)) or (b'\x00'*(bits//24))+frad[i:i+(bits//8)] for i in range(0, len(frad), bits//8)])
+            smpl = np.frombuffer(frad, np.uint8)[:len(frad)//(bits//8)*(bits//8)].reshape(-1, bits//8)
+            pad = np.zeros((len(smpl), bits//24), np.uint8)
+            frad = np.hstack(be and (smpl, pad) or (pad, smpl)).tobytes()
         elif bits == 12:
-            hexa = frad.hex()
-            if len(hexa)%3!=0: hexa=hexa[:-1]
-            frad = bytes.fromhex(''.join([f'{hexa[i:i+3]}0' for i in range(0, len(hexa), 3)]))
+            trio = np.pad(np.frombuffer(frad, np.uint8), (0, -len(frad)%3)).astype('>u2').reshape(-1, 3)
+            smpl = np.stack([trio[:, 0] << 4 | trio[:, 1] >> 4, (trio[:, 1] & 0xf) << 8 | trio[:, 2]], axis=1).ravel()
+            frad = (smpl[:len(frad)*2//3] << 4).astype('>u2').tobytes()
         else: raise Exception('Illegal bits value.')
 
         # Unpacking and unravelling
         if bits%8!=0: endian = '>'
-        freqs: np.ndarray = np.frombuffer(frad, endian+fourier.dtypes[bits]).astype(float).reshape(-1, channels).T
+        freqs: np.ndarray = np.frombuffer(frad, endian+fourier.dtypes[bits]).astype(float).reshape(-1, channels)
 
         # Removing potential Infinities and Non-numbers
         freqs = np.where(np.isnan(freqs) | np.isinf(freqs), 0, freqs)
 
-        # Inverse DCT and stacking
-        return np.ascontiguousarray(np.array([idct(chnl) for chnl in freqs]).T)
+        # Inverse DCT
+        return transform.idct(freqs, **kwargs)
@@ -1,6 +1,6 @@
-import json, shutil, struct, sys
-from .common import variables, methods, terminal
-from .tools.headb import headb
+import json, os, shutil, struct, sys, tempfile
+from .common import methods, terminal
+from .tools.headb import headb, imageref
 
 class header:
     @staticmethod
@@ -27,10 +27,10 @@ class header:
         remove = kwargs.get('remove', False)
         write_img = kwargs.get('write_img', False)
         remove_img = kwargs.get('remove_img', False)
+        # Room reserved for later edits when the header has to be rewritten
+        padding: int = kwargs.get('padding', 4096)
         try:
-            # Backup file
-            shutil.copy2(file_path, variables.temp)
-            with open(variables.temp, 'rb') as f:
+            with open(file_path, 'rb') as f:
                 # Fixed Header
                 head = f.read(64)
 
@@ -38,13 +38,9 @@ class header:
                     head_len = struct.unpack('>Q', head[0x8:0x10])[0] # 0x08-8B: Total header size
                 else: head_len = 0
 
-                # Backing up audio data
-                f.seek(head_len)
-                with open(variables.temp2, 'wb') as temp:
-                    temp.write(f.read())
-
-            # Making new header
-            meta_old, img_old = headb.parser(file_path)
+            # Making new header, the cover art is only read if it is kept
+            meta_old, img_old = headb.parser(file_path, lazy=True)
+            index = headb.parse_index(file_path)
             if add:
                 img = img_old
                 if meta: meta = meta_old + meta
@@ -55,11 +51,30 @@ class header:
                 meta = meta_old
                 if img_old and not img: img = img_old
             elif remove_img: meta = meta_old; img = None
-            head_new = headb.uilder(meta, img)
+            if isinstance(img, imageref): img = img.read()
+            head_new = headb.uilder(meta, img, index)
+
+            # Fits in the current header, padding takes the rest and only the header is rewritten
+            if head_len and (len(head_new) == head_len or len(head_new) + 8 <= head_len):
+                head_new = headb.uilder(meta, img, index, padding=head_len-len(head_new))
+                with open(file_path, 'r+b') as f: f.write(head_new)
+                return
 
-            # Overwriting Fourier Analogue-in-Digital file
-            open(variables.temp, 'wb').write(head_new+open(variables.temp2, 'rb').read())
-            shutil.move(variables.temp, file_path)
+            # Otherwise streaming the audio after a new header, next to the original so the move is a rename
+            head_new = headb.uilder(meta, img, index, padding=padding)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file_path)), prefix='frad_', suffix='.frad', delete=False) as temp:
+                try:
+                    temp.write(head_new)
+                    with open(file_path, 'rb') as f:
+                        f.seek(head_len)
+                        shutil.copyfileobj(f, temp, 2**20)
+                    temp.close()
+                    shutil.copymode(file_path, temp.name)
+                    os.replace(temp.name, file_path)
+                except BaseException:
+                    temp.close()
+                    os.remove(temp.name)
+                    raise
         except KeyboardInterrupt:
             terminal('Aborting...')
             sys.exit(0)
@@ -1,11 +1,50 @@
-from .decoder import decode
-from .common import terminal
+from .common import terminal, methods
+from .reader import reader
+import math, sys
+from .tools.playback import playback
+
+RM_CLI = '\x1b[1A\x1b[2K'
 
 class player:
     @staticmethod
-    def play(file_path, gain, keys: float | None = None, speed: float | None = None, e: bool = False, verbose: bool = False):
+    def play(file_path, gain, keys: float | None = None, speed: float | None = None, e: bool = False, verbose: bool = False, **kwargs):
         if keys and speed: terminal('Keys and Speed parameter cannot be set at the same time.'); return
         elif keys and not speed: speed = 2**(keys/12)
         elif not keys and speed: pass
         else: speed = 1
-        decode.internal(file_path, play=True, speed=speed, ecc=e, gain=gain, verbose=verbose)
+
+        # Seconds decoded ahead of the device, and the output stream class, sounddevice.OutputStream unless a stand-in is given
+        lookahead: float = kwargs.get('lookahead', 0.5)
+        output = kwargs.get('output', None)
+        if output is None:
+            import sounddevice as sd
+            output = sd.OutputStream
+
+        with reader(file_path, ecc=e, gain=gain, mmap=kwargs.get('mmap', False)) as r:
+            duration = r.duration / speed
+            pb = playback(r.blocks(), output, speed=speed, lookahead=lookahead).start()
+            printed = False
+            try:
+                while not pb.wait(0.1):
+                    printed = player.status(pb, duration, speed, verbose, printed)
+            except KeyboardInterrupt:
+                pb.stop()
+                sys.exit(0)
+            if printed: terminal(RM_CLI*(verbose and 2 or 1), end='')
+        stats = pb.counters()
+        if verbose and stats['underruns']: terminal(f'{stats['underruns']} underrun{(stats['underruns']!=1)*"s"}, {methods.tformat(stats['underrun_samples']/max(pb.format[0], 1))} of silence inserted')
+        return stats
+
+    @staticmethod
+    def status(pb: playback, duration: float, speed: float, verbose: bool, printed: bool) -> bool:
+        srate, channels = pb.format
+        if not srate: return printed
+        lgs = int(math.log(srate, 1000))
+        cq = {1:'Mono',2:'Stereo',4:'Quad',6:'5.1 Surround',8:'7.1 Surround'}.get(channels, f'{channels} ch')
+        if printed: terminal(RM_CLI*(verbose and 2 or 1), end='')
+        terminal(f'{methods.tformat(pb.position()/speed)} / {methods.tformat(duration)}, {srate/10**(lgs*3)} {['','k','M','G','T'][lgs]}Hz {cq}')
+        if verbose:
+            ring, stats = pb.ring, pb.counters()
+            fill = ring is not None and ring.size / ring.capacity * 100 or 0
+            terminal(f'Buffer {fill:.1f}% of {pb.lookahead:.3f}s, {stats['underruns']} underrun{(stats['underruns']!=1)*"s"}, {stats['xruns']} device underflow{(stats['xruns']!=1)*"s"}')
+        return True
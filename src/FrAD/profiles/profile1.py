@@ -1,7 +1,8 @@
-from scipy.fft import dct, idct
 import numpy as np
 from .tools import p1tools
-import struct, zlib
+from ..tools.stats import stats
+from ..tools.transform import transform
+import bz2, lzma, struct, zlib
 
 class p1:
     srates = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000)
@@ -11,6 +12,14 @@ class p1:
     depths = (8, 12, 16, 24, 32, 48, 64)
     dtypes = {64:'i8',48:'i8',32:'i4',24:'i4',16:'i2',12:'i2',8:'i1'}
 
+    # Compression of the entropy-coded frame, zlib streams are untagged as they always were and the others start with a tag byte
+    # A zlib stream begins with CMF 0x?8, none of the tags does, so the method is told apart from the frame alone
+    tags = {'none': 0x00, 'lzma': 0x01, 'bz2': 0x02}
+    levels = {'none': (0, 0), 'zlib': (0, 9), 'lzma': (0, 9), 'bz2': (1, 9)}
+    defaults = {'none': 0, 'zlib': 9, 'lzma': 6, 'bz2': 9}
+    presets = {'fast': 'zlib:1', 'balanced': 'zlib:9', 'max': 'max'}
+    lzma_dict = 2**20 # LZMA2 dictionary, fixed so raw streams need no header
+
     @staticmethod
     def signext_24x(byte: bytes, bits, be):
         return (int((be and byte.hex()[0] or byte.hex()[-1]), base=16) > 7 and b'\xff' or b'\x00') * (bits//24) + byte
@@ -20,23 +29,63 @@ class p1:
         if len(hex_str)!=3: return ''
         return (int(hex_str[0], base=16) > 7 and 'f' or '0') + hex_str
 
+    @staticmethod
+    def method(spec: str | None) -> tuple[str, int]:
+        # 'zlib', 'zlib:6', 'lzma', 'bz2:9', 'none', or a preset, into (method, level)
+        spec = p1.presets.get(spec or 'balanced', spec)
+        if spec == 'max': return 'max', 0
+        method, _, level = spec.partition(':')
+        if method not in p1.levels: raise ValueError(f'Unknown compression method: {method}, use one of {", ".join(list(p1.levels)+list(p1.presets))}')
+        if not level: return method, p1.defaults[method]
+        lo, hi = p1.levels[method]
+        if not level.isdigit() or not hi >= int(level) >= lo: raise ValueError(f'Invalid {method} level: {level}, should be between {lo} and {hi}')
+        return method, int(level)
+
+    @staticmethod
+    def compress(data: bytes, method: str, level: int) -> bytes:
+        if method == 'zlib': return zlib.compress(data, level=level)
+        if method == 'lzma': return bytes([p1.tags['lzma']]) + lzma.compress(data, lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'preset': level, 'dict_size': p1.lzma_dict}])
+        if method == 'bz2': return bytes([p1.tags['bz2']]) + bz2.compress(data, level)
+        # Smallest of every method, stored as is when nothing helps
+        if method == 'max': return min((p1.compress(data, m, p1.defaults[m]) for m in ('zlib', 'lzma', 'bz2', 'none')), key=len)
+        return bytes([p1.tags['none']]) + data
+
+    @staticmethod
+    def decompress(frad: bytes | memoryview) -> tuple[bytes, str]:
+        # Inflated frame and the method it was stored with
+        if frad[0] & 0x0f == 8: return zlib.decompress(frad), 'zlib'
+        tag, frad = frad[0], frad[1:]
+        if tag == p1.tags['lzma']: return lzma.decompress(frad, lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'dict_size': p1.lzma_dict}]), 'lzma'
+        if tag == p1.tags['bz2']: return bz2.decompress(frad), 'bz2'
+        if tag == p1.tags['none']: return bytes(frad), 'none'
+        raise ValueError(f'Unknown compression tag: {tag}')
+
     @staticmethod
     def analogue(pcm: np.ndarray, bits: int, channels: int, **kwargs) -> tuple[bytes, int, int, int]:
         # DCT
+        t = stats.start()
         pcm = np.pad(pcm, ((0, min((x for x in p1.smpls_li if x >= len(pcm)), default=len(pcm))-len(pcm)), (0, 0)), mode='constant')
         dlen = len(pcm)
-        freqs = np.array([dct(pcm[:, i]*(2**(bits-1))) for i in range(channels)]) / dlen
+        freqs = transform.dct(pcm, 2**(bits-1), **kwargs).T / dlen
+        stats.stop('p1.dct', t, pcm.nbytes, freqs.nbytes)
 
         # Quantisation
+        t = stats.start()
         freqs, pns = p1tools.quant(freqs, channels, dlen, **kwargs)
+        stats.stop('p1.quant', t, freqs.nbytes, freqs.nbytes)
 
         # Ravelling and packing
+        t = stats.start()
         pns_glm = p1tools.exp_golomb_rice_encode(np.frombuffer(np.array(pns.T/(2**(bits-1))).astype('>f2').tobytes(), dtype=f'>i2'))
-        frad: bytes = p1tools.exp_golomb_rice_encode(freqs.T.ravel().astype(int))
+        frad: bytes = p1tools.exp_golomb_rice_encode(freqs.T.ravel().astype(int), p1tools.block)
         frad = struct.pack(f'>I', len(pns_glm)) + pns_glm + frad
+        stats.stop('p1.golomb', t, freqs.nbytes, len(frad))
 
         # Deflating
-        frad = zlib.compress(frad, level=9)
+        method, level = p1.method(kwargs.get('compression', None))
+        t, size = stats.start(), len(frad)
+        frad = p1.compress(frad, method, level)
+        stats.stop(f'p1.{method}', t, size, len(frad))
 
         return frad, bits, channels, p1.depths.index(bits)
 
@@ -45,19 +94,28 @@ class p1:
         bits = p1.depths[fb]
 
         # Inflating
-        frad = zlib.decompress(frad)
+        t, size = stats.start(), len(frad)
+        frad, method = p1.decompress(frad)
+        stats.stop(f'p1.{method}.decompress', t, size, len(frad))
+        t, size = stats.start(), len(frad)
         thresbytes, frad = struct.unpack(f'>I', frad[:4])[0], frad[4:]
-        thres_int, frad = p1tools.exp_golomb_rice_decode(frad[:thresbytes]).astype(f'>i2').tobytes(), frad[thresbytes:]
+        thres_int, frad = p1tools.exp_golomb_rice_decode(frad[:thresbytes], channels*p1tools.subbands).astype(f'>i2').tobytes(), frad[thresbytes:]
         thres = np.frombuffer(thres_int, dtype=f'>f2').reshape((-1, channels)).T * (2**(bits-1))
 
-        # Unpacking and unravelling
-        freqs: np.ndarray = p1tools.exp_golomb_rice_decode(frad).astype(float).reshape(-1, channels).T
+        # Unpacking and unravelling, fsize is the padded DCT length
+        freqs: np.ndarray = p1tools.exp_golomb_rice_decode(frad, channels*kwargs['fsize']).astype(float).reshape(-1, channels).T
+        stats.stop('p1.golomb.decode', t, size, freqs.nbytes)
 
         # Removing potential Infinities and Non-numbers
         freqs = np.where(np.isnan(freqs) | np.isinf(freqs), 0, freqs)
 
         # Dequantisation
+        t = stats.start()
         freqs = p1tools.dequant(freqs, channels, thres, **kwargs)
+        stats.stop('p1.dequant', t, freqs.nbytes, freqs.nbytes)
 
-        # Inverse DCT and stacking
-        return np.ascontiguousarray(np.array([idct(chnl*len(chnl)) for chnl in freqs]).T)/(2**(bits-1))
+        # Inverse DCT
+        t = stats.start()
+        pcm = transform.idct(freqs.T, freqs.shape[1], **kwargs) / (2**(bits-1))
+        stats.stop('p1.idct', t, freqs.nbytes, pcm.nbytes)
+        return pcm
@@ -1,5 +1,6 @@
 import numpy as np
-import struct
+from array import array
+import struct, threading
 
 # Modified Opus Subbands
 MOS =  (0,     200,   400,   600,   800,   1000,  1200,  1400,
@@ -9,86 +10,201 @@ MOS =  (0,     200,   400,   600,   800,   1000,  1200,  1400,
 
 subbands = len(MOS) - 1
 rndint = lambda x: int(x+0.5)
+block = 256 # Coefficients sharing a Golomb-Rice parameter
+# 1s in every byte value
+popcount = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(1)
 
 class pns:
+    # Absolute threshold of hearing at the centre of every subband, the open-ended top one unbounded
+    ath = np.full(subbands, np.inf)
+    for i in range(subbands):
+        if MOS[i+1] == -1: continue
+        f = (MOS[i] + MOS[i+1]) / 2
+        ABS = (3.64*(f/1000.)**-0.8 - 6.5*np.exp(-0.6*(f/1000.-3.3)**2.) + 1e-3*((f/1000.)**4.))
+        ath[i] = 10.0**((np.clip(ABS, None, 96)-96)/20)
+    del i, f, ABS
+
+    # First bin and bin count of every subband per (dlen, srate)
+    bands: dict[tuple[int, int], tuple[np.ndarray, np.ndarray]] = {}
+    lock = threading.Lock()
+
     @staticmethod
     def getbinrng(dlen: int, srate: int, subband_index: int) -> slice:
         return slice(rndint(dlen/(srate/2)*MOS[subband_index]),
             MOS[subband_index+1] == -1 and None or rndint(dlen/(srate/2)*MOS[subband_index+1]))
 
+    @staticmethod
+    def binedges(dlen: int, srate: int) -> tuple[np.ndarray, np.ndarray]:
+        with pns.lock:
+            if (dlen, srate) not in pns.bands:
+                rng = np.array([pns.getbinrng(dlen, srate, i).indices(dlen)[:2] for i in range(subbands)])
+                pns.bands[(dlen, srate)] = rng[:, 0], np.maximum(rng[:, 1] - rng[:, 0], 0)
+            return pns.bands[(dlen, srate)]
+
     @staticmethod
     def mask_thres_MOS(freqs: np.ndarray, alpha: float) -> np.ndarray:
-        thres = np.zeros_like(freqs)
-        for i in range(subbands):
-            if MOS[i+1] == -1: thres[i] = np.inf; continue
-            f = (MOS[i] + MOS[i+1]) / 2
-            ABS = (3.64*(f/1000.)**-0.8 - 6.5*np.exp(-0.6*(f/1000.-3.3)**2.) + 1e-3*((f/1000.)**4.))
-            ABS = np.clip(ABS, None, 96)
-            thres[i] = np.maximum(freqs[i]**alpha, 10.0**((ABS-96)/20))
-        return thres
+        # freqs in [..., subbands]
+        return np.maximum(freqs**alpha, pns.ath)
 
     @staticmethod
     def mapping2opus(freqs: np.ndarray, srate):
-        mapped_freqs = np.zeros(subbands)
-        for i in range(subbands):
-            subfreqs = freqs[pns.getbinrng(len(freqs), srate, i)]
-            if len(subfreqs) > 0:
-                mapped_freqs[i] = np.sqrt(np.mean(subfreqs**2))
+        # RMS of every subband of every channel, freqs in [..., dlen]
+        starts, counts = pns.binedges(freqs.shape[-1], srate)
+        mapped_freqs = np.zeros(freqs.shape[:-1] + (subbands,))
+        used = counts > 0
+        mapped_freqs[..., used] = np.sqrt(np.add.reduceat(freqs**2, starts[used], axis=-1) / counts[used])
         return mapped_freqs
 
     @staticmethod
     def mappingfromopus(mapped_freqs, freqs_shape, srate):
-        freqs = np.zeros(freqs_shape)
-        for i in range(subbands):
-            freqs[pns.getbinrng(freqs_shape, srate, i)] = mapped_freqs[i]
-        return freqs
+        # Spreading [..., subbands] back to [..., dlen]
+        return np.repeat(mapped_freqs, pns.binedges(freqs_shape, srate)[1], axis=-1)
 
 def quant(freqs: np.ndarray, channels: int, dlen: int, **kwargs) -> tuple[np.ndarray, np.ndarray]:
     alpha = 0.8
 
     const_factor = 1.25**kwargs['level'] / 19 + 0.5
 
-    # Perceptual Noise Substitution
-    pns_sgnl = []
-    mask = []
-    for c in range(channels):
-        thres = pns.mask_thres_MOS(
-            pns.mapping2opus(np.abs(freqs[c]),kwargs['srate']),alpha) * const_factor
-        mask.append(thres)
-        pns_sgnl.append(np.around(freqs[c] / pns.mappingfromopus(thres,dlen,kwargs['srate'])))
+    # Perceptual Noise Substitution, all channels at once
+    freqs = freqs[:channels]
+    mask = pns.mask_thres_MOS(pns.mapping2opus(np.abs(freqs), kwargs['srate']), alpha) * const_factor
+    pns_sgnl = np.around(freqs / pns.mappingfromopus(mask, dlen, kwargs['srate']))
 
-    return np.array(pns_sgnl), np.array(mask)
+    return pns_sgnl, mask
 
 def dequant(pns_sgnl: np.ndarray, channels: int, masks: np.ndarray, **kwargs) -> np.ndarray:
     masks = np.where(np.isnan(masks) | np.isinf(masks), 0, masks)
-    return np.array([pns_sgnl[c] * pns.mappingfromopus(masks[c], len(pns_sgnl[c]), kwargs['srate']) for c in range(channels)])
-
-bitstr2bytes = lambda bstr: bytes(int(bstr[i:i+8].ljust(8, '0'), 2) for i in range(0, len(bstr), 8))
-bytes2bitstr = lambda b: ''.join(f'{byte:08b}' for byte in b)
-
-def exp_golomb_rice_encode(data: np.ndarray):
+    return pns_sgnl[:channels] * pns.mappingfromopus(masks[:channels], pns_sgnl.shape[-1], kwargs['srate'])
+
+def bit_length(data: np.ndarray) -> np.ndarray:
+    data, length = data.copy(), np.zeros(data.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        upper = data >> np.uint64(shift)
+        length += (upper != 0) * shift
+        data = np.where(upper != 0, upper, data)
+    return length + (data != 0)
+
+def rice_params(n: np.ndarray, block: int) -> np.ndarray:
+    # Cheapest k for every block of mapped values, from a histogram of bit lengths per block
+    # Codeword length for bit length L is about 2*max(L, k+1) - (k+1), the carry of n + 2**k is left out
+    blen = np.frexp(n.astype(float))[1]
+    hist = np.bincount(np.arange(len(n)) // block * 65 + blen, minlength=-(-len(n)//block)*65).reshape(-1, 65)
+    ks = np.arange(64)
+    cost = hist @ (2*np.maximum(np.arange(65)[:, None], ks+1) - (ks+1))
+    return cost.argmin(1)
+
+def exp_golomb_rice_encode(data: np.ndarray, block: int = 0):
+    # One k for the whole stream, or one per block of coefficients if block is set and that comes out strictly smaller
+    data = np.asarray(data).astype(np.int64).ravel()
+    n = np.where(data > 0, 2*data-1, -2*data).astype(np.uint64)
     dmax = np.abs(data).max()
     k = dmax and int(np.ceil(np.log2(dmax))) or 0
-    encoded = ''
-    for n in data:
-        n = (n>0) and (2*n-1) or (-2*n)
-        binary_code = bin(n + 2**k)[2:]
-        m = len(binary_code) - (k+1)
-        encoded += ('0' * m + binary_code)
-
-    return struct.pack('B', k) + bitstr2bytes(encoded)
-
-def exp_golomb_rice_decode(dbytes: bytes):
-    k = struct.unpack('B', dbytes[:1])[0]
-    decoded = []
-    data = bytes2bitstr(dbytes[1:])
-    while data:
-        try: m = data.index('1')
-        except: break
-
-        codeword, data = data[:(m*2)+k+1], data[(m*2)+k+1:]
-        n = int(codeword, 2) - 2**k
-        n = (n%2==1) and ((n+1)//2) or (-n//2)
-        decoded.append(n)
-
-    return np.array(decoded)
+
+    # Codeword = m zeros + (n + 2**k) in binary, m = bit length - (k+1), 2*bit length - (k+1) bits in all
+    codes = n + (np.uint64(1) << np.uint64(k))
+    blen = bit_length(codes)
+    if block:
+        ks = rice_params(n, block)
+        kb = np.repeat(ks, block)[:len(n)]
+        bcodes = n + (np.uint64(1) << kb.astype(np.uint64))
+        bblen = bit_length(bcodes)
+        # Block size and a k for every block against a single k byte
+        if 3 + len(ks) + -(-int((2*bblen - kb - 1).sum())//8) < 1 + -(-int((2*blen - k - 1).sum())//8):
+            k, codes, blen = kb, bcodes, bblen
+        else: block = 0
+
+    # Split in two runs, the unary prefixes of every codeword (m zeros and the leading 1) first,
+    # then the m+k bits below the leading 1 of every codeword, so the prefixes alone give every boundary
+    ends = np.cumsum(blen - k)
+    rlen = blen - 1
+    rends = ends[-1] + np.cumsum(rlen)
+
+    # Scattering set bits of every codeword at once, LSB first
+    bits = np.zeros(rends[-1], dtype=np.uint8)
+    bits[ends-1] = 1
+    for j in range(int(rlen.max())):
+        bits[rends[((codes >> np.uint64(j)) & np.uint64(1)).astype(bool) & (rlen > j)] - (j+1)] = 1
+
+    if not block: return struct.pack('B', 0x40 | k) + np.packbits(bits).tobytes()
+    # 0xc0, block size and k of every block, then both runs
+    return struct.pack('>BH', 0xc0, block) + ks.astype(np.uint8).tobytes() + np.packbits(bits).tobytes()
+
+def exp_golomb_rice_decode(dbytes: bytes, count: int = 0):
+    # Split layouts carry 0x40 in the first byte and need the number of codewords, the older interleaved ones below it do not
+    if not dbytes[0] & 0x40: return interleaved_decode(dbytes)
+    if dbytes[0] & 0x80:
+        size = struct.unpack('>H', dbytes[1:3])[0]
+        nblk = -(-count//size)
+        k = np.repeat(np.frombuffer(dbytes, np.uint8, nblk, 3).astype(np.int64), size)[:count]
+        data = np.frombuffer(dbytes, dtype=np.uint8, offset=3+nblk)
+    else:
+        k = dbytes[0] & 0x3f
+        data = np.frombuffer(dbytes, dtype=np.uint8, offset=1)
+    if count == 0: return np.array([], dtype=np.int64)
+
+    # The prefixes end on the count-th 1, only the bytes up to it are unpacked
+    ones = np.flatnonzero(np.unpackbits(data[:np.searchsorted(np.cumsum(popcount[data]), count)+1]).view(bool))[:count]
+    rlen = np.diff(ones, prepend=-1)
+    rlen += k - 1
+    start = np.cumsum(rlen)
+    start -= rlen - (int(ones[-1]) + 1)
+
+    # Reading the m+k bits below the leading 1 of each codeword through a 64-bit sliding window
+    window = np.ndarray((len(data)+1,), dtype='>u8', buffer=np.append(data, np.zeros(8, dtype=np.uint8)), strides=(1,))
+    ulen = rlen.view(np.uint64)
+    codes = window[start >> 3] << (start.view(np.uint64) & np.uint64(7)) >> np.uint64(1) >> (np.uint64(63) - ulen)
+    if (rlen > 57).any():
+        bits = np.unpackbits(data)
+        for i in np.flatnonzero(rlen > 57): codes[i] = int(''.join(map(str, bits[start[i]:start[i]+rlen[i]])), 2)
+    codes |= np.uint64(1) << ulen
+
+    # n + 2**k back to n, then odd n to positive and even n to zero or negative
+    n = codes.view(np.int64) - (np.int64(1) << np.asarray(k, np.int64))
+    sign = (n & 1) - 1
+    return ((n + 1) >> 1 ^ sign) - sign
+
+def interleaved_decode(dbytes: bytes):
+    # Codewords back to back, one k below 0x80 in the first byte or one per block with block bit lengths
+    if dbytes[0] & 0x80:
+        nblk = struct.unpack('>I', dbytes[1:5])[0]
+        ks = np.frombuffer(dbytes, np.uint8, nblk, 5).astype(np.int64)
+        lens = np.frombuffer(dbytes, '>u2', nblk, 5+nblk).astype(np.int64)
+        data = np.frombuffer(dbytes, dtype=np.uint8, offset=5+3*nblk)
+    else:
+        k = struct.unpack('B', dbytes[:1])[0]
+        data = np.frombuffer(dbytes, dtype=np.uint8, offset=1)
+    bits = np.unpackbits(data)
+    ones = np.flatnonzero(bits.view(bool))
+    if len(ones) == 0: return np.array([], dtype=np.int64)
+
+    # Next codeword position from every bit position p: p + 2m + k + 1 = 2*(first 1 from p) - p + k + 1
+    end = int(ones[-1]) + 1
+    # k of the block each bit position falls in
+    if dbytes[0] & 0x80: k = np.repeat(ks, lens)[:end]
+    nxt = np.repeat(2*ones, np.diff(ones, prepend=-1)) + (k+1)
+    nxt -= np.arange(end)
+
+    # Jumps of 1, 2, 4 and 8 codewords, trailing zero padding after the last 1 collapses into the terminal node
+    jumps = [np.append(np.minimum(nxt, end), end)]
+    for _ in range(3): jumps.append(jumps[-1][jumps[-1]])
+    # Walking the longest one from bit 0, extend() keeps reading the starts it has just appended
+    # until the lookup runs off the table at the terminal node
+    starts = [0]
+    try: starts.extend(map(jumps[-1][:end].item, starts))
+    except IndexError: pass
+    # Then the starts in between from the shorter jumps, interleaved so they stay in stream order
+    starts = np.frombuffer(array('q', starts), np.int64)
+    for jump in reversed(jumps[:-1]): starts = np.stack([starts, jump[starts]], 1).ravel()
+    starts = starts[starts < end]
+    if dbytes[0] & 0x80: k = k[starts]
+
+    # Reading (n + 2**k) from the leading 1 of each codeword through a 64-bit sliding window
+    lead = (nxt[starts] + starts - (k+1)) >> 1
+    blen = lead - starts + (k+1)
+    window = np.ndarray((len(data)+1,), dtype='>u8', buffer=np.append(data, np.zeros(8, dtype=np.uint8)), strides=(1,))
+    codes = (window[lead >> 3] << (lead & 7).astype(np.uint64)) >> (64 - blen).astype(np.uint64)
+    for i in np.flatnonzero(blen > 57):
+        codes[i] = int(''.join(map(str, bits[lead[i]:lead[i]+blen[i]])), 2)
+
+    n = codes.astype(np.int64) - (np.int64(1) << np.asarray(k, np.int64))
+    return np.where(n%2==1, (n+1)//2, -n//2)
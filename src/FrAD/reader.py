@@ -0,0 +1,65 @@
+from .common import methods
+from .decoder import decode
+import io, struct
+import numpy as np
+from .tools.headb import headb
+from .tools.sync import mapped
+
+class reader:
+    # Random access to decoded PCM by sample position, decoding only the frames around the requested range
+    # Positions count samples per channel from the start of the stream, across sample rate changes
+    def __init__(self, file_path: str, **kwargs):
+        self.fix_error: bool = kwargs.get('ecc', False)
+        self.gain: float = kwargs.get('gain', 1)
+
+        self.file = open(file_path, 'rb')
+        self.f: io.BufferedReader | mapped = kwargs.get('mmap', False) and mapped.open(self.file) or self.file
+        head = self.f.read(64)
+        self.head_len = methods.signature(head[0x0:0x4]) == 'container' and struct.unpack('>Q', head[0x8:0x10])[0] or 0
+
+        # Files without a usable frame index get one by walking the frame headers once
+        index = self.head_len and headb.parse_index(file_path) or None
+        if index is None or not index.entries: index = decode.scan(self.f, self.head_len)
+        self.index = index
+        self.samples: int = index.samples
+        self.duration: float = index.duration
+        self.position = 0
+
+    def seek(self, sample: int) -> int:
+        self.position = min(max(sample, 0), self.samples)
+        return self.position
+
+    def tell(self) -> int: return self.position
+
+    def blocks(self, start: int | None = None, stop: int | None = None):
+        # Yields (samples, srate, channels) covering exactly [start, stop), from the current position to the end by default
+        start = self.position if start is None else min(max(start, 0), self.samples)
+        stop = self.samples if stop is None else min(max(stop, start), self.samples)
+        offset, pos = decode.locate(self.f, self.head_len, self.index, start)
+        self.f.seek(offset)
+        self.position = start
+        if start == stop: return
+        for pcm, srate, channels in decode.blocks(self.f, self.fix_error, self.gain):
+            block = pcm[max(start-pos, 0):max(stop-pos, 0)]
+            pos += len(pcm)
+            if len(block):
+                self.position = min(pos, stop)
+                yield block, srate, channels
+            if pos >= stop: break
+
+    def read(self, start: int | None = None, stop: int | None = None) -> tuple[np.ndarray, int, int]:
+        # PCM in [samples, channels] with its sample rate and channels, the range must not span a format change
+        blocks = list(self.blocks(start, stop))
+        if not blocks:
+            entry = self.index.locate_sample(self.position)
+            srate, channels = entry and entry[3:] or (0, 0)
+            return np.zeros((0, channels)), srate, channels
+        if len({b[1:] for b in blocks}) > 1: raise ValueError('Sample rate or channels change within the range, read it with blocks() instead.')
+        return np.concatenate([b[0] for b in blocks]), blocks[0][1], blocks[0][2]
+
+    def close(self) -> None:
+        if self.f is not self.file: self.f.close()
+        self.file.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
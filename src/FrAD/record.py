@@ -1,11 +1,11 @@
-from .fourier import fourier
-from .common import variables, terminal
+from .common import variables, terminal, methods
 from .encoder import encode
+from .writer import writer
+from .tools.stats import stats
 import numpy as np
-import math, os, sys
-import sounddevice as sd
-from .tools.ecc import ecc
-from .tools.headb import headb
+import os, queue, sys, threading
+
+RM_CLI = '\x1b[1A\x1b[2K'
 
 class recorder:
     @staticmethod
@@ -20,18 +20,30 @@ class recorder:
         little_endian: bool = kwargs.get('le', False)
         profile: int = kwargs.get('prf', 0)
         loss_level: int = kwargs.get('lv', 0)
+        compression: str | None = kwargs.get('comp', None)
         overlap: int = kwargs.get('olap', variables.overlap_rate)
 
         # ECC settings
         apply_ecc = kwargs.get('ecc', False)
         ecc_sizes = kwargs.get('ecc_sizes', [96, 24])
-        ecc_dsize = ecc_sizes[0]
-        ecc_codesize = ecc_sizes[1]
 
         # Metadata
         meta = kwargs.get('meta', None)
         img = kwargs.get('img', None)
 
+        # Frame index, one entry per N frames
+        index_interval = kwargs.get('index', None)
+        padding = kwargs.get('padding', 0)
+
+        # Input stream class and device, sounddevice.InputStream and asked interactively unless given
+        stream = kwargs.get('input', None)
+        hw = kwargs.get('device', None)
+        verbose: bool = kwargs.get('verbose', False)
+        printed = False
+        if stream is None or hw is None or channels is None:
+            import sounddevice as sd
+            stream = stream or sd.InputStream
+
         # segmax for Profile 0 = 4GiB / (intra-channel-sample size * channels * ECC mapping)
         # intra-channel-sample size = bit depth * 8, least 3 bytes(float s1e8m15)
         # ECC mapping = (block size / data size)
@@ -40,27 +52,25 @@ class recorder:
         if fsize > segmax[profile]: terminal(f'Sample size cannot exceed {segmax}.'); sys.exit(1)
         if profile == 1: fsize = min((x for x in variables.p1.smpls_li if x >= fsize), default=2048)
         if not 20 >= loss_level >= 0: terminal(f'Invalid compression level: {loss_level} Lossy compression level should be between 0 and 20.'); sys.exit()
+        try: variables.p1.method(compression)
+        except ValueError as e: terminal(e); sys.exit(1)
 
         if profile in [1, 2]:
             srate = min(srate, 96000)
             if not srate in variables.p1.srates: srate = 48000
 
-        if not isinstance(overlap, (int, float)): overlap = variables.overlap_rate
-        elif overlap <= 0: overlap = 0
-        elif overlap <= 0.5: overlap = int(1/overlap)
-        elif overlap < 2: overlap = 2
-        elif overlap > 255: overlap = 255
-        if overlap%1!=0: overlap = int(overlap)
-        terminal('Please enter your recording device ID from below.')
-        for ind, dev in enumerate(sd.query_devices()):
-            if dev['max_input_channels'] != 0:
-                terminal(f'{ind} {dev['name']}')
-                terminal(f'    srate={dev['default_samplerate']}\t channels={dev['max_input_channels']}')
-        while True:
-            terminal('> ', end='')
-            try: hw = int(input())
-            except: continue
-            if hw in range(len(sd.query_devices())): break
+        overlap = encode.overlap_rate(overlap)
+        if hw is None:
+            terminal('Please enter your recording device ID from below.')
+            for ind, dev in enumerate(sd.query_devices()):
+                if dev['max_input_channels'] != 0:
+                    terminal(f'{ind} {dev['name']}')
+                    terminal(f'    srate={dev['default_samplerate']}\t channels={dev['max_input_channels']}')
+            while True:
+                terminal('> ', end='')
+                try: hw = int(input())
+                except: continue
+                if hw in range(len(sd.query_devices())): break
 
         if channels is None: channels = sd.query_devices()[hw]['max_input_channels']
 
@@ -76,31 +86,74 @@ class recorder:
                 x = input().lower()
                 if x == 'y': break
                 if x == 'n': sys.exit('Aborted.')
-        ecc_dsize, ecc_codesize = int(ecc_sizes[0]), int(ecc_sizes[1])
         terminal('Recording...')
-        open(file_path, 'wb').write(headb.uilder(meta, img))
-        prev = np.array([])
-
-        record = sd.InputStream(samplerate=srate, channels=channels, device=hw, dtype=np.float32)
+        # Capture only queues the input from the callback, framing, ECC and writing happen on the encoder thread
+        # Recording length is unknown, the index interval grows once the reserved entries run out
+        out = writer(file_path, srate, channels, bit_depth, fsize=fsize, le=little_endian, prf=profile, lv=loss_level, comp=compression, olap=overlap,
+            ecc=apply_ecc, ecc_sizes=ecc_sizes, meta=meta, img=img, index=index_interval, padding=padding)
+        cap = capture(out, srate).start()
+        record = stream(samplerate=srate, channels=channels, device=hw, dtype=np.float32, callback=cap.callback)
         record.start()
-        with open(file_path, 'ab') as f:
-            while True:
-                try:
-                    rlen = fsize
-                    while rlen < len(prev): rlen += 128
-                    # Overlap
-                    if profile in [1, 2] and len(prev) != 0: rlen -= len(prev)
-                    data = record.read(rlen)[0]
-                    if overlap: data, prev = encode.overlap(data, prev, overlap, profile)
-                    frame, _, chnl, bf = fourier.analogue(data, bit_depth, channels, little_endian, profile=profile, srate=srate, level=loss_level)
-
-                    # Applying ECC (This will make encoding hundreds of times slower)
-                    if apply_ecc: frame = ecc.encode(frame, ecc_dsize, ecc_codesize)
-
-                    pfb = headb.encode_pfb(profile, apply_ecc, little_endian, bf)
-                    encode.write_frame(f, frame, chnl, srate, pfb, (ecc_dsize, ecc_codesize), len(data), olap=overlap)
-
-                except KeyboardInterrupt:
-                    break
+        try:
+            while cap.running(0.25):
+                if verbose: printed = cap.status(printed)
+        except KeyboardInterrupt: pass
+        record.stop()
         record.close()
+        cap.finish()
+        if verbose and printed: terminal(RM_CLI, end='')
         terminal('Recording stopped.')
+        stats = cap.counters()
+        if stats['overflows']: terminal(f'{stats['overflows']} input overflow{(stats['overflows']!=1)*"s"}, samples were lost by the device')
+        if verbose: terminal(f'{methods.tformat(stats['captured']/srate)} recorded, backlog peaked at {methods.tformat(stats['backlog_peak']/srate)}')
+        return stats
+
+class capture:
+    # Input callback to encoder handoff, the callback only copies into a SimpleQueue and never waits on the encoder
+    def __init__(self, out: writer, srate: int):
+        self.out, self.srate = out, srate
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.captured = self.encoded = self.overflows = self.backlog_peak = 0
+        self.error: BaseException | None = None
+        self.thread = threading.Thread(target=self.encode, daemon=True)
+
+    def start(self) -> 'capture':
+        self.thread.start()
+        return self
+
+    def callback(self, indata: np.ndarray, frames: int, time, status) -> None:
+        # sounddevice input callback
+        t = stats.start()
+        if status and status.input_overflow: self.overflows += 1
+        self.queue.put(indata.copy())
+        self.captured += frames
+        stats.stop('record.capture', t, 0, indata.nbytes)
+
+    def encode(self) -> None:
+        try:
+            while (pcm := self.queue.get()) is not None:
+                self.backlog_peak = max(self.backlog_peak, self.captured - self.encoded)
+                self.out.write(pcm)
+                self.encoded += len(pcm)
+            self.out.close()
+        except BaseException as e: self.error = e
+
+    def running(self, timeout: float) -> bool:
+        self.thread.join(timeout)
+        if self.error is not None: raise self.error
+        return self.thread.is_alive()
+
+    def finish(self) -> None:
+        # Encoding everything captured so far, then closing the file
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None: raise self.error
+
+    def counters(self) -> dict[str, int]:
+        return {'captured': self.captured, 'encoded': self.encoded, 'overflows': self.overflows,
+                'backlog': self.captured - self.encoded, 'backlog_peak': self.backlog_peak}
+
+    def status(self, printed: bool) -> bool:
+        if printed: terminal(RM_CLI, end='')
+        terminal(f'{methods.tformat(self.captured/self.srate)} recorded, backlog {methods.tformat((self.captured-self.encoded)/self.srate)}, {self.overflows} overflow{(self.overflows!=1)*"s"}')
+        return True
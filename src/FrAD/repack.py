@@ -1,67 +1,160 @@
-from .common import variables, methods
+from .common import methods
 from .decoder import ASFH
 from .encoder import encode
-import os, shutil, struct, sys, time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import os, shutil, struct, sys, tempfile, time, zlib
+from .tools.crc import crc16
 from .tools.ecc import ecc
-from .tools.headb import headb
+from .tools.headb import headb, frameindex
+from .tools.stats import stats
+from .tools.sync import sync
 
 class repack:
     @staticmethod
-    def ecc(file_path, ecc_sizes: list | None = None, verbose: bool = False):
+    def frame(data: bytes, asfh: ASFH, ecc_sizes: tuple[int, int] | None) -> bytes:
+        # Fixing and re-protecting a single frame so it can run on a worker, ecc_sizes None strips the ECC
+        if asfh.ecc:
+            ts, size = stats.start(), len(data)
+            if ((asfh.profile == 0      and zlib.crc32(data) != struct.unpack('>I', asfh.crc)[0])
+            or  (asfh.profile in [1, 2] and crc16.ansi(data) != struct.unpack('>H', asfh.crc)[0])
+            ): data = ecc.decode(data, asfh.ecc_dsize, asfh.ecc_codesize); stats.stop('ecc.decode', ts, size, len(data))
+            # Intact frames already carrying the requested ECC are copied as they are
+            elif ecc_sizes == (asfh.ecc_dsize, asfh.ecc_codesize): stats.stop('ecc.check', ts, size, size); return data
+            else: data = ecc.unecc(data, asfh.ecc_dsize, asfh.ecc_codesize); stats.stop('ecc.check', ts, size, len(data))
+        if ecc_sizes is None: return data
+
+        ts, size = stats.start(), len(data)
+        data = ecc.encode(data, *ecc_sizes)
+        stats.stop('ecc.encode', ts, size, len(data))
+        return data
+
+    @staticmethod
+    def frames(f, ecc_sizes: tuple[int, int] | None, strip: bool, pool: Executor | None = None, ahead: int = 0):
+        # Yields (ASFH, repacked frame, ECC sizes or None) in stream order, keeping up to ahead frames in flight on the pool
+        pending: deque = deque()
+        for _ in sync.frames(f):
+            ts = stats.start()
+            asfh = ASFH()
+            asfh.update(f)
+            data = f.read(asfh.frmbytes)
+            stats.stop('read', ts, asfh.headlen+asfh.frmbytes, 0)
+
+            # New sizes if given, else the frame's own, else the defaults
+            if strip: sizes = None
+            elif ecc_sizes is not None: sizes = tuple(ecc_sizes)
+            elif asfh.ecc and asfh.ecc_dsize != 0 and asfh.ecc_codesize != 0: sizes = (asfh.ecc_dsize, asfh.ecc_codesize)
+            else: sizes = (96, 24)
+
+            if pool is None: yield asfh, repack.frame(data, asfh, sizes), sizes; continue
+            pending.append((asfh, sizes, pool.submit(repack.frame, data, asfh, sizes)))
+            if len(pending) > ahead:
+                asfh, sizes, future = pending.popleft()
+                yield asfh, future.result(), sizes
+        while pending:
+            asfh, sizes, future = pending.popleft()
+            yield asfh, future.result(), sizes
+
+    @staticmethod
+    def ecc(file_path, ecc_sizes: list | None = None, verbose: bool = False, **kwargs):
+        # Frames are repacked on worker threads or processes and streamed in order into a file next to the original
+        strip: bool = kwargs.get('strip', False)
+        threads: int = kwargs.get('threads', 0)
+        processes: int = kwargs.get('processes', 0)
+
         with open(file_path, 'rb') as f:
             head = f.read(64)
 
             if methods.signature(head[0x0:0x4]) == 'container':
                 head_len = struct.unpack('>Q', head[0x8:0x10])[0]
             else: head_len = 0
-            f.seek(head_len)
 
+            # Frame offsets change with the ECC size, rebuilding the index into the same reserved capacity
+            index_old = head_len and headb.parse_index(file_path) or None
+            index = index_old is not None and frameindex(capacity=index_old.capacity, interval=index_old.interval, base=head_len) or None
+            if index is not None: index.position = index_old.position
+
+            pool: Executor | None = None
+            if processes > 0: pool = ProcessPoolExecutor(processes)
+            elif threads > 0: pool = ThreadPoolExecutor(threads)
+            workers = max(processes, threads)
+
+            t = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file_path)), prefix='frad_', suffix='.frad', delete=False)
             try:
+                # Header is copied unchanged
+                f.seek(0)
+                while t.tell() < head_len: t.write(f.read(min(2**20, head_len - t.tell())))
+
                 dlen = os.path.getsize(file_path) - head_len
                 start_time = time.time()
                 total_bytes = 0
-                fhead, printed = None, False
+                printed = False
+                for asfh, frame, sizes in repack.frames(f, ecc_sizes, strip, pool, workers*2):
+                    # EFloat Byte
+                    pfb = headb.encode_pfb(asfh.profile, sizes is not None, asfh.endian, asfh.float_bits)
+                    encode.write_frame(t, frame, asfh.chnl, asfh.srate, pfb, sizes or (0, 0), asfh.fsize, olap=asfh.profile == 1 and asfh.overlap or 0, index=index)
+
+                    if verbose:
+                        total_bytes += asfh.frmbytes+asfh.headlen
+                        elapsed_time = time.time() - start_time
+                        bps = total_bytes / elapsed_time
+                        percent = total_bytes * 100 / dlen
+                        printed = methods.logging(3, strip and 'Stripping ECC' or 'ECC Encoding', printed, percent=percent, bps=bps, time=elapsed_time)
+                if pool: pool.shutdown()
+                t.close()
+                if index is not None: index.patch(t.name)
+                shutil.copymode(file_path, t.name)
+                os.replace(t.name, file_path)
+            except BaseException as e:
+                if pool: pool.shutdown(wait=False, cancel_futures=True)
+                t.close()
+                os.remove(t.name)
+                if isinstance(e, KeyboardInterrupt): sys.exit(1)
+                raise
+
+    @staticmethod
+    def index(file_path, interval: int = 1, verbose: bool = False):
+        with open(file_path, 'rb') as f:
+            head = f.read(64)
+
+            if methods.signature(head[0x0:0x4]) == 'container':
+                head_len = struct.unpack('>Q', head[0x8:0x10])[0]
+            else: head_len = 0
+            f.seek(head_len)
+
+            try:
+                dlen = os.path.getsize(file_path) - head_len
+                start_time = time.time()
+                printed = False
                 asfh = ASFH()
-                with open(variables.temp, 'wb') as t:
-                    while True:
-                        # Finding Audio Stream Frame Header
-                        if fhead is None: fhead = f.read(4)
-                        if fhead != b'\xff\xd0\xd2\x97':
-                            hq = f.read(1)
-                            if not hq: break
-                            fhead = fhead[1:]+hq
-                            continue
-
-                        # Parsing ASFH
-                        asfh.update(f)
-                        # Reading Frame
-                        frame = f.read(asfh.frmbytes)
-
-                        # Fixing errors and repacking
-                        if asfh.ecc: frame = ecc.decode(frame, asfh.ecc_dsize, asfh.ecc_codesize)
-
-                        if ecc_sizes is not None: ecc_dsize, ecc_codesize = ecc_sizes
-                        elif asfh.ecc_dsize != 0 and asfh.ecc_codesize != 0: ecc_dsize, ecc_codesize = asfh.ecc_dsize, asfh.ecc_codesize
-                        else: ecc_dsize, ecc_codesize = 96, 24
-
-                        frame = ecc.encode(frame, ecc_dsize, ecc_codesize)
-
-                        # EFloat Byte
-                        pfb = headb.encode_pfb(asfh.profile, True, asfh.endian, asfh.float_bits)
-                        encode.write_frame(t, frame, asfh.chnl, asfh.srate, pfb, (ecc_dsize, ecc_codesize), asfh.fsize)
-
-                        if verbose:
-                            total_bytes += asfh.frmbytes+asfh.headlen
-                            elapsed_time = time.time() - start_time
-                            bps = total_bytes / elapsed_time
-                            percent = total_bytes * 100 / dlen
-                            printed = methods.logging(3, 'ECC Encoding', printed, percent=percent, bps=bps, time=elapsed_time)
-                        fhead = None
+                # Capacity is trimmed to the entry count once every frame is indexed
+                index = frameindex(capacity=2**32-2, interval=interval, base=head_len)
+                # Finding Audio Stream Frame Header
+                for offset in sync.frames(f):
+                    # Parsing ASFH and skipping the frame
+                    asfh.update(f)
+                    f.seek(asfh.frmbytes, 1)
+                    index.add(offset, asfh.headlen+asfh.frmbytes, asfh.fsize, asfh.srate, asfh.chnl, asfh.profile == 1 and asfh.overlap or 0)
 
-                f.seek(0)
-                head = f.read(head_len)
+                    if verbose:
+                        elapsed_time = time.time() - start_time
+                        printed = methods.logging(1, 'Indexing', printed, percent=(f.tell()-head_len)*100/dlen, time=elapsed_time)
             except KeyboardInterrupt:
                 sys.exit(1)
+            index.capacity = max(len(index.entries), 1)
 
-            open(variables.temp2, 'wb').write(head+open(variables.temp, 'rb').read())
-            shutil.move(variables.temp2, file_path)
+            # Rebuilding header with the index and copying the audio stream after it, next to the original so the move is a rename
+            meta, img = headb.parser(file_path)
+            t = tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file_path)), prefix='frad_', suffix='.frad', delete=False)
+            try:
+                t.write(headb.uilder(meta, img, index))
+                f.seek(head_len)
+                shutil.copyfileobj(f, t, 2**20)
+                t.close()
+                shutil.copymode(file_path, t.name)
+                os.replace(t.name, file_path)
+            except BaseException as e:
+                t.close()
+                os.remove(t.name)
+                if isinstance(e, KeyboardInterrupt): sys.exit(1)
+                raise
@@ -7,6 +7,7 @@ repack_ecc_opt = ['ecc', 'repack']
 play_opt = ['play']
 record_opt = ['record', 'rec']
 update_opt = ['update']
+bench_opt = ['bench', 'benchmark']
 
 def terminal(*args: object, sep: str | None = ' ', end: str | None = '\n'):
     sys.stderr.buffer.write(f'{(sep or '').join(map(str,args))}{end}'.encode())
@@ -198,6 +199,89 @@ def parse_args(args: list[str]) -> tuple[str, str|None, str|None, dict]:
                     terminal(f'Value cannot be parsed as Integer: {arg} {lv}')
                     sys.exit(1)
 
+            # Profile 1 compression method or preset
+            elif key in ('comp', 'compression'):
+                key, value = 'compression', args.pop(0)
+
+            # Frame index
+            elif key in ('idx', 'index'):
+                key, value = 'index', 1
+                if len(args)!=0 and args[0].isdigit(): value = int(args.pop(0))
+
+            # Header padding in bytes
+            elif key in ('padding', 'pad'):
+                n = '<null>'
+                try:
+                    n = args.pop(0)
+                    key, value = 'padding', int(n)
+                except:
+                    terminal(f'Value cannot be parsed as Integer: {arg} {n}')
+                    sys.exit(1)
+
+            # Worker threads or processes
+            elif key in ('t', 'threads', 'p', 'processes'):
+                n = '<null>'
+                try:
+                    n = args.pop(0)
+                    key, value = key in ('t', 'threads') and 'threads' or 'processes', int(n)
+                except:
+                    terminal(f'Value cannot be parsed as Integer: {arg} {n}')
+                    sys.exit(1)
+
+            # Time range in seconds
+            elif key in ('s', 'start', 'end', 'to'):
+                t = '<null>'
+                try:
+                    t = args.pop(0)
+                    key, value = key in ('s', 'start') and 'start' or 'end', float(t)
+                except:
+                    terminal(f'Value cannot be parsed as Float: {arg} {t}')
+                    sys.exit(1)
+
+            # Playback lookahead in seconds
+            elif key in ('lookahead', 'buffer'):
+                t = '<null>'
+                try:
+                    t = args.pop(0)
+                    key, value = 'lookahead', float(t)
+                except:
+                    terminal(f'Value cannot be parsed as Float: {arg} {t}')
+                    sys.exit(1)
+
+            # Benchmark baseline, regression tolerance and repeats
+            elif key in ('baseline', 'base'):
+                key, value = 'baseline', args.pop(0)
+
+            elif key in ('tolerance', 'tol'):
+                t = '<null>'
+                try:
+                    t = args.pop(0)
+                    key, value = 'tolerance', float(t)
+                except:
+                    terminal(f'Value cannot be parsed as Float: {arg} {t}')
+                    sys.exit(1)
+
+            elif key in ('repeat', 'repeats'):
+                r = '<null>'
+                try:
+                    r = args.pop(0)
+                    key, value = 'repeat', int(r)
+                except:
+                    terminal(f'Value cannot be parsed as Integer: {arg} {r}')
+                    sys.exit(1)
+
+            # Per-stage timing report, printed or dumped to a JSON path
+            elif key in ('stats', 'profile-stages'):
+                key, value = 'stats', args and not args[0].startswith('-') and args.pop(0) or True
+
+            # Memory-mapped decoding
+            elif key in ('mmap', 'memory-map'):
+                key, value = 'mmap', True
+
+            # Removing ECC on repack
+            elif key in ('strip', 'strip-ecc', 'no-ecc'):
+                key, value = 'strip', True
+
             # Verbose CLI Toggle
             elif key in ('v', 'verbose'):
                 key, value = 'verbose', True
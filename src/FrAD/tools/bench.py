@@ -0,0 +1,200 @@
+from ..common import variables, terminal
+from ..encoder import encode
+from ..fourier import fourier
+from ..profiles.profile1 import p1
+from ..profiles.tools import p1tools
+from .crc import crc16
+from .ecc import ecc
+from .headb import headb, frameindex
+from .sync import sync
+from .transform import transform
+import io, json, os, platform, struct, sys, tempfile, time, zlib
+import numpy as np
+
+class bench:
+    # Offline timings of every codec stage on synthetic signals, no ffmpeg or audio device involved
+    # Results are the fastest of the timed runs in seconds per call, compared case by case against a stored baseline
+    sizes = (128, 576, 2048, 6144, 16384) # Subset of p1.smpls_li, all of them with full=True
+    channels = (1, 2)
+    srate = 48000
+    budget = 0.3 # Minimum seconds of timed runs per case
+    span = 0.02 # Seconds of one timed run, the budget is split into rounds of these
+
+    @staticmethod
+    def signal(fsize: int, channels: int, seed: int = 0) -> np.ndarray:
+        # Tones with a little noise in [samples, channels], -1 to 1
+        rng = np.random.default_rng(seed)
+        t = np.arange(fsize) / bench.srate
+        return np.stack([0.5*np.sin(2*np.pi*440*(c+1)*t) + 0.05*rng.standard_normal(fsize) for c in range(channels)], 1)
+
+    @staticmethod
+    def calibrate(fn, share: float) -> int:
+        # Loop count that makes one timed run last at least the given seconds
+        n = 1
+        while True:
+            t = time.perf_counter()
+            for _ in range(n): fn()
+            if (elapsed := time.perf_counter() - t) >= share or n >= 2**20: return n
+            n *= max(2, min(int(share / max(elapsed, 1e-9)), 100))
+
+    @staticmethod
+    def time(fn, n: int) -> float:
+        # Seconds per call of one run of n calls
+        t = time.perf_counter()
+        for _ in range(n): fn()
+        return (time.perf_counter() - t) / n
+
+    @staticmethod
+    def cases(tmp: str, full: bool = False):
+        # Yields (name, function, samples processed per call), files go to tmp
+        sizes = full and p1.smpls_li or bench.sizes
+
+        # Transforms and Profile 1 stages by frame size and channels
+        for fsize in sizes:
+            for ch in bench.channels:
+                pcm = bench.signal(fsize, ch)
+                tag, n = f'fsize={fsize}/ch={ch}', fsize*ch
+                freqs = transform.dct(pcm, 2**15).T / fsize
+                yield f'dct/{tag}', lambda pcm=pcm: transform.dct(pcm, 2**15), n
+                yield f'idct/{tag}', lambda f=freqs.T*fsize: transform.idct(f, 2**15), n
+
+                q, pns = p1tools.quant(freqs, ch, fsize, level=5, srate=bench.srate)
+                ints = q.T.ravel().astype(int)
+                glm = p1tools.exp_golomb_rice_encode(ints)
+                pns_glm = p1tools.exp_golomb_rice_encode(np.frombuffer(np.array(pns.T/2**15).astype('>f2').tobytes(), dtype='>i2'))
+                raw = struct.pack('>I', len(pns_glm)) + pns_glm + glm
+                packed = zlib.compress(raw, level=9)
+                yield f'p1.quant/{tag}', lambda f=freqs, ch=ch, fsize=fsize: p1tools.quant(f, ch, fsize, level=5, srate=bench.srate), n
+                yield f'p1.dequant/{tag}', lambda q=q, ch=ch, pns=pns: p1tools.dequant(q, ch, pns, level=5, srate=bench.srate), n
+                yield f'p1.golomb.encode/{tag}', lambda i=ints: p1tools.exp_golomb_rice_encode(i), n
+                yield f'p1.golomb.decode/{tag}', lambda g=glm, c=len(ints): p1tools.exp_golomb_rice_decode(g, c), n
+                yield f'p1.golomb.encode.adaptive/{tag}', lambda i=ints: p1tools.exp_golomb_rice_encode(i, p1tools.block), n
+                yield f'p1.golomb.decode.adaptive/{tag}', lambda g=p1tools.exp_golomb_rice_encode(ints, p1tools.block), c=len(ints): p1tools.exp_golomb_rice_decode(g, c), n
+                yield f'p1.zlib.compress/{tag}', lambda r=raw: zlib.compress(r, level=9), n
+                yield f'p1.zlib.decompress/{tag}', lambda p=packed: zlib.decompress(p), n
+                for method in ('lzma', 'bz2'):
+                    packed = p1.compress(raw, method, p1.defaults[method])
+                    yield f'p1.{method}.compress/{tag}', lambda r=raw, m=method: p1.compress(r, m, p1.defaults[m]), n
+                    yield f'p1.{method}.decompress/{tag}', lambda p=packed: p1.decompress(p), n
+
+                frame, _, _, fb = fourier.analogue(pcm, 16, ch, False, profile=1, srate=bench.srate, level=5)
+                yield f'p1.analogue/{tag}', lambda pcm=pcm, ch=ch: fourier.analogue(pcm, 16, ch, False, profile=1, srate=bench.srate, level=5), n
+                yield f'p1.digital/{tag}', lambda fr=frame, fb=fb, ch=ch, fsize=fsize: fourier.digital(fr, fb, ch, False, profile=1, srate=bench.srate, fsize=fsize), n
+
+        # Profile 1 by loss level
+        pcm = bench.signal(2048, 2)
+        for level in (0, 10, 20):
+            yield f'p1.analogue/lv={level}', lambda level=level: fourier.analogue(pcm, 16, 2, False, profile=1, srate=bench.srate, level=level), 4096
+
+        # Profile 0 by bit depth
+        for bits in variables.bit_depths[0]:
+            for ch in bench.channels:
+                pcm = bench.signal(2048, ch)
+                tag, n = f'bits={bits}/ch={ch}', 2048*ch
+                frame, _, _, fb = fourier.analogue(pcm, bits, ch, False)
+                yield f'p0.analogue/{tag}', lambda pcm=pcm, bits=bits, ch=ch: fourier.analogue(pcm, bits, ch, False), n
+                yield f'p0.digital/{tag}', lambda fr=frame, fb=fb, ch=ch: fourier.digital(fr, fb, ch, False), n
+
+        # Overlap
+        frame = bench.signal(2048, 2)
+        for olap in (2, 4, 16, 255):
+            prev = bench.signal(2048//olap, 2, 1)
+            yield f'overlap/olap={olap}', lambda prev=prev, olap=olap: encode.overlap(frame, prev, olap, 1), 4096
+
+        # ECC on a 16 KiB payload, clean and with a byte error in every tenth block
+        data = np.random.default_rng(0).integers(0, 256, 16384, np.uint8).tobytes()
+        for dsize, codesize in ((96, 24), (128, 32), (192, 48)):
+            tag = f'{dsize}+{codesize}'
+            coded = ecc.encode(data, dsize, codesize)
+            damaged = bytearray(coded)
+            for i in range(0, len(damaged), (dsize+codesize)*10): damaged[i] ^= 0xff
+            damaged = bytes(damaged)
+            yield f'ecc.encode/{tag}', lambda d=(dsize, codesize): ecc.encode(data, *d), len(data)
+            yield f'ecc.decode/{tag}', lambda c=coded, d=(dsize, codesize): ecc.decode(c, *d), len(data)
+            yield f'ecc.decode.damaged/{tag}', lambda c=damaged, d=(dsize, codesize): ecc.decode(c, *d), len(data)
+            yield f'ecc.unecc/{tag}', lambda c=coded, d=(dsize, codesize): ecc.unecc(c, *d), len(data)
+
+        # CRCs
+        for size in (256, 16384, 2**20):
+            buf = np.random.default_rng(size).integers(0, 256, size, np.uint8).tobytes()
+            yield f'crc32/bytes={size}', lambda b=buf: zlib.crc32(b), size
+            yield f'crc16/bytes={size}', lambda b=buf: crc16.ansi(b), size
+
+        # Headers, container and frame
+        meta = [['title', 'Benchmark'], ['artist', 'FrAD'], ['comment', 'x'*1024]]
+        img = bytes(65536)
+        index = frameindex(capacity=1024)
+        for i in range(1024): index.add(i*4096, 4096, 2048, bench.srate, 2)
+        head = headb.uilder(meta, img, index)
+        path = os.path.join(tmp, 'header.frad')
+        with open(path, 'wb') as f: f.write(head)
+        yield 'header.build', lambda: headb.uilder(meta, img, index), 1
+        yield 'header.parse', lambda: headb.parser(path), 1
+        yield 'header.index', lambda: headb.parse_index(path), 1
+        for prf in (0, 1):
+            pfb = headb.encode_pfb(prf, True, False, 2)
+            payload = bytes(4096)
+            yield f'frame.write/prf={prf}', lambda pfb=pfb: encode.write_frame(io.BytesIO(), payload, 2, bench.srate, pfb, (96, 24), 2048, olap=16), 1
+        yield 'frame.css', lambda: headb.decode_css_prf1(headb.encode_css_prf1(2, bench.srate, 2048)), 1
+
+        # Sync scanning, 256 frames with garbage between them
+        rng = np.random.default_rng(1)
+        stream = b''.join(variables.FRM_SIGN + rng.integers(0, 256, 4096 + i % 7, np.uint8).tobytes().replace(b'\xff', b'\x00') for i in range(256))
+        yield 'sync.frames/frames=256', lambda: sum(1 for _ in sync.frames(io.BytesIO(stream))), len(stream)
+
+    @staticmethod
+    def run(**kwargs) -> dict:
+        repeat: int = max(kwargs.get('repeat', 5), 1)
+        full: bool = kwargs.get('full', False)
+        verbose: bool = kwargs.get('verbose', False)
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            cases = list(bench.cases(tmp, full))
+            rounds = max(repeat, round(bench.budget / bench.span))
+            loops = [bench.calibrate(fn, bench.budget / rounds) for _, fn, _ in cases]
+            # One run of every case per round, so a slow spell of the machine hits a few runs of a case and not all of them
+            runs = [[] for _ in cases]
+            for _ in range(rounds):
+                for (_, fn, _), n, r in zip(cases, loops, runs): r.append(bench.time(fn, n))
+        for (name, _, n), r in zip(cases, runs):
+            sec = min(r)
+            results[name] = {'seconds': sec, 'per_second': n / sec, 'runs': r}
+            if verbose: terminal(f'{name:<40} {sec*1e6:12.2f} us')
+        return {
+            'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                     'system': platform.system(), 'repeat': rounds, 'full': full, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results
+        }
+
+    @staticmethod
+    def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> list[tuple[str, float, float, float]]:
+        # (name, baseline seconds, current seconds, ratio) for cases slower than the fastest baseline run
+        # by more than the tolerance in every run, so one noisy run cannot flag a case
+        slower = []
+        for name, cur in results['results'].items():
+            base = baseline.get('results', {}).get(name)
+            if base is None: continue
+            best = min(base.get('runs', [base['seconds']]))
+            ratio = min(cur.get('runs', [cur['seconds']])) / best
+            if ratio > 1 + tolerance: slower.append((name, best, cur['seconds'], ratio))
+        return slower
+
+    @staticmethod
+    def main(output: str | None, **kwargs) -> int:
+        # Exit status 1 if anything regressed against the baseline
+        if kwargs.get('baseline', None) is not None and kwargs.get('repeat', 5) < 3:
+            terminal('At least 3 repeats are needed to compare against a baseline.')
+            return 1
+        results = bench.run(**kwargs)
+        if output is None or output == '-': sys.stdout.write(json.dumps(results, indent=2) + '\n')
+        else:
+            with open(output, 'w') as f: json.dump(results, f, indent=2)
+        if (path := kwargs.get('baseline', None)) is None: return 0
+        with open(path) as f: baseline = json.load(f)
+        slower = bench.compare(results, baseline, kwargs.get('tolerance', 0.25))
+        for name, base, cur, ratio in slower:
+            terminal(f'Regression: {name} {base*1e6:.2f} us -> {cur*1e6:.2f} us (x{ratio:.2f})')
+        missing = set(baseline.get('results', {})) - set(results['results'])
+        if missing: terminal(f'{len(missing)} baseline case{(len(missing)!=1)*"s"} not run')
+        if not slower: terminal(f'No regressions against {path}')
+        return slower and 1 or 0
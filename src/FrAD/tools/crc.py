@@ -0,0 +1,52 @@
+import numpy as np
+import threading
+
+class crc16:
+    # CRC-16/ANSI(ARC), reflected 0x8005 with zero init and no final xor
+    # Zero init makes it linear, so leading zeros change nothing and a CRC can be carried over appended zero bytes by table lookup
+    width = 256 # Bytes per chunk, every chunk of a buffer is checksummed in one gather
+    table = np.array([(lambda c: [c := (c >> 1) ^ 0xA001 if c & 0x0001 else c >> 1 for _ in range(8)][-1])(i) for i in range(256)], np.uint16)
+    chunk: np.ndarray | None = None                # chunk[j, v]: CRC of byte v at column j of an otherwise zero chunk
+    shifts: list[tuple[np.ndarray, np.ndarray]] = [] # CRC of width*2^level zero bytes appended, by low and high byte
+    lock = threading.Lock()
+
+    @staticmethod
+    def zeros(crc: np.ndarray, n: int) -> np.ndarray:
+        for _ in range(n): crc = (crc >> 8) ^ crc16.table[crc & 0xff]
+        return crc
+
+    @staticmethod
+    def shift(crc: np.ndarray, level: int) -> np.ndarray:
+        with crc16.lock:
+            while len(crc16.shifts) <= level:
+                if not crc16.shifts: lo, hi = crc16.zeros(np.arange(256, dtype=np.uint16), crc16.width), crc16.zeros(np.arange(256, dtype=np.uint16) << 8, crc16.width)
+                else:
+                    # Doubling the previous level by applying it twice
+                    plo, phi = crc16.shifts[-1]
+                    lo, hi = plo[plo & 0xff] ^ phi[plo >> 8], plo[phi & 0xff] ^ phi[phi >> 8]
+                crc16.shifts.append((lo, hi))
+        lo, hi = crc16.shifts[level]
+        return lo[crc & 0xff] ^ hi[crc >> 8]
+
+    @staticmethod
+    def ansi(data: bytes | memoryview) -> int:
+        data = np.frombuffer(data, np.uint8)
+        if len(data) == 0: return 0
+        if crc16.chunk is None:
+            with crc16.lock:
+                chunk = np.empty((crc16.width, 256), np.uint16)
+                chunk[-1] = crc16.table
+                for j in range(crc16.width-2, -1, -1): chunk[j] = crc16.zeros(chunk[j+1], 1)
+                crc16.chunk = chunk
+
+        # Left-padding to whole chunks and checksumming all of them at once
+        data = np.pad(data, (-len(data) % crc16.width, 0)).reshape(-1, crc16.width)
+        crcs = np.bitwise_xor.reduce(crc16.chunk[np.arange(crc16.width), data], axis=1)
+
+        # Folding neighbouring chunks pairwise, the left one carried over the length of the right one
+        level = 0
+        while len(crcs) > 1:
+            if len(crcs) % 2: crcs = np.append(np.uint16(0), crcs)
+            crcs = crc16.shift(crcs[0::2], level) ^ crcs[1::2]
+            level += 1
+        return int(crcs[0])
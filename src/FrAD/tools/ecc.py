@@ -1,14 +1,91 @@
 from reedsolo import RSCodec, ReedSolomonError
+import numpy as np
+import threading
+
+class gf256:
+    # GF(2^8) with the reedsolo defaults, primitive polynomial 0x11d and generator 2
+    exp = np.zeros(510, np.uint8)
+    log = np.zeros(256, np.int64)
+    x = 1
+    for i in range(255):
+        exp[i], log[x] = x, i
+        x <<= 1
+        if x & 0x100: x ^= 0x11d
+    exp[255:] = exp[:255]
+    del x, i
+
+    @staticmethod
+    def mul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        a, b = np.asarray(a), np.asarray(b)
+        return np.where((a == 0) | (b == 0), 0, gf256.exp[gf256.log[a] + gf256.log[b]]).astype(np.uint8)
+
+class rscode:
+    # Per-position lookup tables of a (blocksize, blocksize-codesize) code, every block of a frame encoded and checked in one gather
+    def __init__(self, ecc_dsize: int, ecc_codesize: int):
+        self.dsize, self.codesize = ecc_dsize, ecc_codesize
+        values = np.arange(256)
+
+        # Generator polynomial, highest degree first, roots a^0 .. a^(codesize-1)
+        gen = np.array([1], np.uint8)
+        for i in range(ecc_codesize):
+            gen = np.append(gen, 0) ^ np.append(0, gf256.mul(gen, gf256.exp[i]))
+
+        # x^(codesize+p) mod gen for every message position p counted from the last byte
+        rem = np.zeros((ecc_dsize, ecc_codesize), np.uint8)
+        if ecc_codesize:
+            rem[0] = gen[1:]
+            for p in range(1, ecc_dsize):
+                rem[p] = np.append(rem[p-1][1:], 0) ^ gf256.mul(gen[1:], rem[p-1][0])
+        # parity[j, v] = contribution of message byte v at column j, columns ordered first to last
+        self.parity = gf256.mul(values[None, :, None], rem[::-1, None, :])
+
+        # syndrome[q, v, i] = v * a^(i*q) for codeword position q counted from the last byte
+        blocksize = ecc_dsize + ecc_codesize
+        powers = gf256.exp[np.outer(np.arange(blocksize), np.arange(ecc_codesize)) % 255]
+        self.syndrome = gf256.mul(values[None, :, None], powers[::-1, None, :])
+
+    def encode(self, blocks: np.ndarray) -> np.ndarray:
+        # blocks in [n, dsize], shorter messages left-padded with zeros, returns parity in [n, codesize]
+        return np.bitwise_xor.reduce(self.parity[np.arange(self.dsize), blocks], axis=1)
+
+    def check(self, blocks: np.ndarray) -> np.ndarray:
+        # blocks in [n, blocksize], left-padded with zeros, returns True for blocks with any nonzero syndrome
+        synd = np.bitwise_xor.reduce(self.syndrome[np.arange(self.dsize + self.codesize), blocks], axis=1)
+        return synd.any(axis=1)
 
 class ecc:
+    codecs: dict[tuple[int, int], RSCodec] = {}
+    codes: dict[tuple[int, int], rscode] = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def codec(ecc_codesize: int, blocksize: int) -> RSCodec:
+        # RSCodec rebuilds reedsolo's global field tables on creation, so codecs are created once and shared
+        with ecc.lock:
+            if (ecc_codesize, blocksize) not in ecc.codecs: ecc.codecs[(ecc_codesize, blocksize)] = RSCodec(ecc_codesize, blocksize)
+            return ecc.codecs[(ecc_codesize, blocksize)]
+
+    @staticmethod
+    def code(ecc_dsize: int, ecc_codesize: int) -> rscode:
+        with ecc.lock:
+            if (ecc_dsize, ecc_codesize) not in ecc.codes: ecc.codes[(ecc_dsize, ecc_codesize)] = rscode(ecc_dsize, ecc_codesize)
+            return ecc.codes[(ecc_dsize, ecc_codesize)]
+
+    @staticmethod
+    def blocks(data: np.ndarray, size: int) -> tuple[np.ndarray, np.ndarray]:
+        # Full blocks in [n, size] and the last block left-padded with zeros to size
+        full = len(data) // size * size
+        tail = data[full:]
+        return data[:full].reshape(-1, size), np.pad(tail, (size-len(tail), 0)).reshape(-1, size)[:len(tail) and 1]
+
     @staticmethod
     def unecc(data: bytes, ecc_dsize: int, ecc_codesize: int) -> bytes:
         blocksize = ecc_dsize + ecc_codesize
+        data = np.frombuffer(data, np.uint8)
+        full = len(data) // blocksize * blocksize
 
-        block = bytearray()
-        for i in range(0, len(data), blocksize):
-            block.extend(data[i:i+blocksize][:-ecc_codesize]) # Carrying Data Bytes from ECC chunk
-        return bytes(block)
+        # Carrying Data Bytes from ECC chunks
+        return data[:full].reshape(-1, blocksize)[:, :-ecc_codesize].tobytes() + data[full:][:-ecc_codesize].tobytes()
 
     @staticmethod
     def split_data(data: bytes, chunk_size: int):
@@ -16,22 +93,32 @@ class ecc:
 
     @staticmethod
     def encode(data: bytes, ecc_dsize: int, ecc_codesize: int) -> bytes:
-        blocksize = ecc_dsize + ecc_codesize
-        rs = RSCodec(ecc_codesize, blocksize)
+        code = ecc.code(ecc_dsize, ecc_codesize)
+        data = np.frombuffer(data, np.uint8)
+        full, tail = ecc.blocks(data, ecc_dsize)
 
-        encoded_chunks = [bytes(rs.encode(chunk)) for chunk in ecc.split_data(data, ecc_dsize)]
-        data = b''.join(encoded_chunks)
-        return data
+        # Appending parity to every block, the last one may be shorter
+        encoded = np.hstack([full, code.encode(full)]).tobytes()
+        if len(tail): encoded += data[len(full)*ecc_dsize:].tobytes() + code.encode(tail).tobytes()
+        return encoded
 
     @staticmethod
     def decode(data: bytes, ecc_dsize: int, ecc_codesize: int) -> bytes:
         blocksize = ecc_dsize + ecc_codesize
-        rs = RSCodec(ecc_codesize, blocksize)
-
-        decoded_chunk = []
-        for chunk in ecc.split_data(data, blocksize):
-            try:
-                decoded_chunk.append(bytes(rs.decode(chunk)[0]))
-            except ReedSolomonError as e:
-                decoded_chunk.append(b'\x00'*ecc_dsize)
-        return b''.join(decoded_chunk)
+        code = ecc.code(ecc_dsize, ecc_codesize)
+        data = np.frombuffer(data, np.uint8)
+        full, tail = ecc.blocks(data, blocksize)
+        # A last block without any data byte is left to reedsolo as it always was
+        if len(data) % blocksize and len(data) % blocksize <= ecc_codesize: tail = tail[:0]
+        corrupt = np.flatnonzero(code.check(np.vstack([full, tail])))
+        if len(data) % blocksize and not len(tail): corrupt = np.append(corrupt, len(full))
+
+        # Only blocks with nonzero syndromes go through full correction
+        blocks = [b.tobytes() for b in full[:, :ecc_dsize]]
+        if len(data) % blocksize: blocks.append(data[len(full)*blocksize:][:-ecc_codesize].tobytes())
+        if len(corrupt):
+            rs = ecc.codec(ecc_codesize, blocksize)
+            for i in corrupt:
+                try: blocks[i] = bytes(rs.decode(data[i*blocksize:(i+1)*blocksize].tobytes())[0])
+                except ReedSolomonError as e: blocks[i] = b'\x00'*ecc_dsize
+        return b''.join(blocks)
@@ -1,8 +1,10 @@
 from ..common import variables, methods
-import base64, math, struct
+import base64, bisect, math, struct
 
 IMAGE =   b'\xf5'
 COMMENT = b'\xfa\xaa'
+INDEX =   b'\xf6\x1d'
+PADDING = b'\xf6\xad'
 
 class metablock:
     @staticmethod
@@ -22,6 +24,120 @@ class metablock:
         block_length = struct.pack('>Q', len(data) + 10)
         return bytes(IMAGE + apictype + block_length + data)
 
+    @staticmethod
+    def index(interval: int, entries: list[tuple[int, int, int, int, int]], capacity: int) -> bytes:
+        # Reserving the whole capacity so the block can be overwritten in place once encoding is done
+        block_length = (16 + frameindex.entry.size * (capacity+1)).to_bytes(6, 'big')
+        data = b''.join([frameindex.entry.pack(*e) for e in entries])
+        return bytes(INDEX + block_length + struct.pack('>II', interval, len(entries)) + data.ljust(frameindex.entry.size * (capacity+1), b'\x00'))
+
+    @staticmethod
+    def padding(size: int) -> bytes:
+        # Zeroed space reserved for editing the header in place, at least its own 8-byte block header
+        size = max(size, 8)
+        return bytes(PADDING + size.to_bytes(6, 'big') + b'\x00'*(size-8))
+
+class imageref:
+    # Cover art left in the file, read only when needed
+    def __init__(self, file_path: str, offset: int, size: int, pictype: int = 3):
+        self.file_path, self.offset, self.size, self.pictype = file_path, offset, size, pictype
+
+    def read(self) -> bytes:
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.size)
+
+    def __len__(self) -> int: return self.size
+
+class frameindex:
+    # Frame number, Byte offset from the first frame, Sample position, Sample rate, Channels
+    entry = struct.Struct('>QQQIH')
+
+    def __init__(self, capacity: int = 8192, interval: int = 1, base: int = 0):
+        self.capacity, self.interval = max(capacity, 1), max(interval, 1)
+        self.base = base          # File offset of the first frame, subtracted from the offsets fed to add()
+        self.position = None      # File offset of the index block, known once written or parsed
+        self.entries: list[tuple[int, int, int, int, int]] = []
+        self.frames = self.samples = self.tail = self.end = 0
+        self.format: tuple[int, int] | None = None
+        self.times: list[float] = []
+        self.duration = 0.0
+        self.dropped = False
+
+    def add(self, offset: int, length: int, fsize: int, srate: int, chnl: int, olap: int = 0) -> None:
+        # Samples are counted as decode.overlap emits them, overlapping tail held back until the next frame
+        if self.dropped: pass
+        elif (srate, chnl) != self.format:
+            self.samples += self.tail
+            self.entries.append((self.frames, offset-self.base, self.samples, srate, chnl))
+        elif self.frames % self.interval == 0:
+            self.entries.append((self.frames, offset-self.base, self.samples, srate, chnl))
+        self.tail = olap and -(-fsize//min(max(olap, 2), 255)) or 0
+        self.samples += fsize - self.tail
+        self.frames += 1
+        self.format = (srate, chnl)
+        self.end = offset - self.base + length
+        while len(self.entries) > self.capacity: self.decimate()
+
+    def decimate(self) -> None:
+        # Doubling the interval, entries where the sample rate or channels change are always kept
+        self.interval *= 2
+        self.entries = [e for i, e in enumerate(self.entries) if e[0] % self.interval == 0 or i == 0 or e[3:] != self.entries[i-1][3:]]
+        if len(self.entries) > self.capacity and self.interval > self.frames: self.entries, self.dropped = [], True
+
+    def tobytes(self) -> bytes:
+        # Entries followed by the end of stream, empty if the index could not fit its capacity
+        entries = self.entries
+        if self.format is not None and not self.dropped: entries = entries + [(self.frames, self.end, self.samples+self.tail, *self.format)]
+        return metablock.index(self.interval, entries, self.capacity)
+
+    @staticmethod
+    def frombytes(block: bytes) -> 'frameindex':
+        # block without the type and length fields
+        interval, count = struct.unpack('>II', block[:8])
+        index = frameindex(capacity=len(block[8:])//frameindex.entry.size-1, interval=interval)
+        index.entries = [frameindex.entry.unpack_from(block, 8+i*frameindex.entry.size) for i in range(count)]
+        if index.entries:
+            index.frames, index.end, index.samples, *index.format = index.entries.pop()
+            index.format = tuple(index.format)
+        index.timeline()
+        return index
+
+    def timeline(self) -> None:
+        # Playback time of each entry, constant sample rate between consecutive entries
+        time, self.times = 0.0, []
+        for i, e in enumerate(self.entries):
+            if i: time += (e[2] - self.entries[i-1][2]) / self.entries[i-1][3]
+            self.times.append(time)
+        if self.entries: self.duration = time + (self.samples - self.entries[-1][2]) / self.entries[-1][3]
+
+    def locate(self, time: float) -> tuple[int, int, int, int, int] | None:
+        # Last indexed frame starting at or before the given time in seconds
+        if not self.entries: return None
+        return self.entries[max(bisect.bisect_right(self.times, time) - 1, 0)]
+
+    def locate_frame(self, frame: int) -> tuple[int, int, int, int, int] | None:
+        if not self.entries: return None
+        return self.entries[max(bisect.bisect_right(self.entries, frame, key=lambda e: e[0]) - 1, 0)]
+
+    def locate_sample(self, sample: int, before: int = 0) -> tuple[int, int, int, int, int] | None:
+        # Last indexed frame starting at or before the given sample position, or the entry that many before it
+        if not self.entries: return None
+        return self.entries[max(bisect.bisect_right(self.entries, sample, key=lambda e: e[2]) - 1 - before, 0)]
+
+    def sample(self, time: float) -> int:
+        # Sample position of a time in seconds, at the sample rate in effect there
+        if not self.entries: return 0
+        i = max(bisect.bisect_right(self.times, time) - 1, 0)
+        return self.entries[i][2] + round((time - self.times[i]) * self.entries[i][3])
+
+    def patch(self, file_path: str) -> None:
+        # Overwriting the reserved index block in place
+        if self.position is None: return
+        with open(file_path, 'r+b') as f:
+            f.seek(self.position)
+            f.write(self.tobytes())
+
 class headb:
     @staticmethod
     def encode_pfb(profile: int, isecc: bool, little_endian: bool, bits: int) -> bytes:
@@ -59,21 +175,29 @@ class headb:
         return channels, srate, fsize
 
     @staticmethod
-    def uilder(meta: list[list[str]] | None = None, img: bytes | None = None):
+    def uilder(meta: list[list[str]] | None = None, img: bytes | imageref | None = None, index: frameindex | None = None, padding: int = 0):
         signature = b'fRad'
         blocks = bytes()
 
         if meta:
             for i in range(len(meta)): blocks += metablock.comment(meta[i][0], meta[i][1])
-        if img: blocks += metablock.image(img)
+        if isinstance(img, imageref): blocks += metablock.image(img.read(), img.pictype)
+        elif img: blocks += metablock.image(img)
+        if index:
+            index.position = 64 + len(blocks)
+            blocks += index.tobytes()
+        # Padding goes last, so the blocks before it can grow into it
+        if padding: blocks += metablock.padding(padding)
 
         length = struct.pack('>Q', (64 + len(blocks)))
+        if index: index.base = 64 + len(blocks)
 
         header = signature + (b'\x00'*4) + length + (b'\x00'*48) + blocks
         return header
 
     @staticmethod
-    def parser(file_path: str) -> tuple[list[str], bytes | None]:
+    def parser(file_path: str, lazy: bool = False) -> tuple[list[str], bytes | imageref | None]:
+        # With lazy=True the cover art is returned as an imageref instead of being read
         meta, img = [], None
         with open(file_path, 'rb') as f:
             head = f.read(64)
@@ -92,7 +216,33 @@ class headb:
                         meta.append(d)
                     elif block_type[0] == 0xf5:
                         block_length = int(struct.unpack('>Q', f.read(8))[0])
-                        img = f.read(block_length-10)
+                        if lazy:
+                            img = imageref(file_path, f.tell(), block_length-10, block_type[1] & 0b11111)
+                            f.seek(block_length-10, 1)
+                        else: img = f.read(block_length-10)
+                    elif block_type in (INDEX, PADDING):
+                        block_length = int.from_bytes(f.read(6), 'big')
+                        f.seek(block_length-8, 1)
                     elif block_type == b'\xff\xd0': break
             elif ftype == 'stream': return [], None
         return meta, img
+
+    @staticmethod
+    def parse_index(file_path: str) -> frameindex | None:
+        with open(file_path, 'rb') as f:
+            head = f.read(64)
+            if methods.signature(head[0x0:0x4]) != 'container': return None
+            head_len = struct.unpack('>Q', head[0x8:0x10])[0]
+            while f.tell() < head_len:
+                block_type = f.read(2)
+                if block_type in (COMMENT, PADDING):
+                    f.seek(int.from_bytes(f.read(6), 'big')-8, 1)
+                elif block_type[:1] == IMAGE:
+                    f.seek(struct.unpack('>Q', f.read(8))[0]-10, 1)
+                elif block_type == INDEX:
+                    position = f.tell() - 2
+                    index = frameindex.frombytes(f.read(int.from_bytes(f.read(6), 'big')-8))
+                    index.base, index.position = head_len, position
+                    return index
+                else: break
+        return None
@@ -0,0 +1,169 @@
+import numpy as np
+import threading, time
+
+class ringbuffer:
+    # Fixed-size PCM queue between a decode thread and an audio callback
+    # write() blocks while full, read() never blocks and pads with silence, counting it as an underrun unless the stream has ended
+    def __init__(self, capacity: int, channels: int):
+        self.data = np.zeros((max(capacity, 1), channels), np.float32)
+        self.capacity, self.channels = len(self.data), channels
+        self.head = self.size = 0
+        self.cond = threading.Condition()
+        self.ended = self.closed = False
+        self.underruns = self.underrun_samples = self.xruns = self.played = 0
+
+    def write(self, pcm: np.ndarray) -> None:
+        pcm = pcm.reshape(-1, self.channels)
+        while len(pcm):
+            with self.cond:
+                while self.size == self.capacity and not self.closed: self.cond.wait()
+                if self.closed: return
+                tail = (self.head + self.size) % self.capacity
+                n = min(len(pcm), self.capacity - self.size, self.capacity - tail)
+                self.data[tail:tail+n] = pcm[:n]
+                self.size += n
+                self.cond.notify_all()
+            pcm = pcm[n:]
+
+    def read(self, out: np.ndarray) -> int:
+        with self.cond:
+            n = min(len(out), self.size)
+            first = min(n, self.capacity - self.head)
+            out[:first] = self.data[self.head:self.head+first]
+            out[first:n] = self.data[:n-first]
+            out[n:] = 0
+            self.head, self.size = (self.head + n) % self.capacity, self.size - n
+            self.played += n
+            if n < len(out) and not self.ended: self.underruns += 1; self.underrun_samples += len(out) - n
+            self.cond.notify_all()
+        return n
+
+    def callback(self, outdata: np.ndarray, frames: int, time, status) -> None:
+        # sounddevice output callback
+        if status and status.output_underflow: self.xruns += 1
+        self.read(outdata)
+
+    def finish(self) -> None:
+        # No more writes, silence from here on is the end of stream and not an underrun
+        with self.cond: self.ended = True; self.cond.notify_all()
+
+    def drain(self, timeout: float | None = None) -> bool:
+        with self.cond: return self.cond.wait_for(lambda: self.size == 0 or self.closed, timeout)
+
+    def close(self) -> None:
+        # Releasing a blocked writer, e.g. when playback is interrupted
+        with self.cond: self.closed = True; self.cond.notify_all()
+
+class nullstream:
+    # Stand-in for sounddevice.OutputStream, pulling the callback from a thread in real time or as fast as possible
+    # Keeps what it was given when capture=True
+    def __init__(self, samplerate: float, channels: int, callback, blocksize: int = 1024, realtime: bool = False, capture: bool = False, **kwargs):
+        self.samplerate, self.channels, self.callback = samplerate, channels, callback
+        self.blocksize = blocksize or 1024
+        self.realtime, self.capture = realtime, capture
+        self.captured: list[np.ndarray] = []
+        self.frames = 0
+        self.active = False
+        self.thread: threading.Thread | None = None
+
+    def run(self) -> None:
+        started = time.time()
+        while self.active:
+            out = np.zeros((self.blocksize, self.channels), np.float32)
+            self.callback(out, self.blocksize, None, None)
+            if self.capture: self.captured.append(out)
+            self.frames += self.blocksize
+            if self.realtime: time.sleep(max(started + self.frames / self.samplerate - time.time(), 0))
+            else: time.sleep(0)
+
+    def start(self) -> None:
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.active = False
+        if self.thread is not None and self.thread is not threading.current_thread(): self.thread.join()
+
+    def abort(self) -> None: self.stop()
+    def close(self) -> None: self.stop()
+
+class playback:
+    # Plays (samples, srate, channels) blocks through a callback output stream, fed from a ring buffer by a decode thread
+    # A new stream is opened whenever the sample rate or channels change, after the previous one has drained
+    def __init__(self, blocks, output, speed: float = 1, lookahead: float = 0.5):
+        self.blocks, self.output = blocks, output
+        self.speed, self.lookahead = speed, lookahead
+        self.ring: ringbuffer | None = None
+        self.stream = None
+        self.format: tuple[int, int] = (0, 0)
+        self.started = self.stopped = False
+        self.error: BaseException | None = None
+        self.retired = 0.0 # Seconds played by retired streams
+        self.stats = {'underruns': 0, 'underrun_samples': 0, 'xruns': 0, 'played': 0, 'streams': 0}
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+
+    def start(self) -> 'playback':
+        self.thread.start()
+        return self
+
+    def feed(self) -> None:
+        try:
+            for pcm, srate, channels in self.blocks:
+                if self.stopped: break
+                if (srate, channels) != self.format: self.switch(srate, channels)
+                # Writing in pieces of half the ring, so a block larger than the ring cannot block before the device is started
+                pcm, step = pcm.astype(np.float32).reshape(-1, channels), max(self.ring.capacity // 2, 1)
+                for i in range(0, len(pcm), step):
+                    if self.stopped: break
+                    self.ring.write(pcm[i:i+step])
+                    # Prefilling half of the lookahead before the device starts pulling
+                    if not self.started and self.ring.size >= self.ring.capacity // 2: self.begin()
+            self.retire()
+        except BaseException as e: self.error = e
+
+    def switch(self, srate: int, channels: int) -> None:
+        self.retire()
+        self.format = (srate, channels)
+        self.ring = ringbuffer(int(srate * self.lookahead), channels)
+        self.stream = self.output(samplerate=int(srate*self.speed), channels=channels, dtype='float32', callback=self.ring.callback)
+        self.started = False
+        self.stats['streams'] += 1
+
+    def begin(self) -> None:
+        self.stream.start()
+        self.started = True
+
+    def retire(self) -> None:
+        if self.ring is None: return
+        self.ring.finish()
+        if not self.started and not self.stopped: self.begin()
+        self.ring.drain()
+        self.stream.stop()
+        self.stream.close()
+        for k in ('underruns', 'underrun_samples', 'xruns', 'played'): self.stats[k] += getattr(self.ring, k)
+        self.retired += self.ring.played / self.format[0]
+        self.ring = None
+
+    def position(self) -> float:
+        # Seconds of source audio played so far
+        ring = self.ring
+        return self.retired + (ring is not None and ring.played / self.format[0] or 0)
+
+    def counters(self) -> dict[str, int]:
+        ring, stats = self.ring, dict(self.stats)
+        if ring is not None:
+            for k in ('underruns', 'underrun_samples', 'xruns', 'played'): stats[k] += getattr(ring, k)
+        return stats
+
+    def wait(self, timeout: float | None = None) -> bool:
+        # True once playback has finished
+        self.thread.join(timeout)
+        if self.error is not None and not self.thread.is_alive(): raise self.error
+        return not self.thread.is_alive()
+
+    def stop(self) -> None:
+        self.stopped = True
+        ring, stream = self.ring, self.stream
+        if ring is not None: ring.close()
+        if stream is not None: stream.abort()
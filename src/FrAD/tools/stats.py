@@ -0,0 +1,45 @@
+from ..common import terminal
+import json, threading, time
+
+class stats:
+    # Cumulative time, calls and bytes in/out per stage, off unless enabled
+    # Stages nest, e.g. p1.quant is also counted in fourier.analogue, and work done in worker processes is not collected
+    enabled = False
+    table: dict[str, list] = {} # stage: [seconds, calls, bytes in, bytes out]
+    lock = threading.Lock()
+
+    @staticmethod
+    def enable(on: bool = True) -> None: stats.enabled = on
+
+    @staticmethod
+    def reset() -> None:
+        with stats.lock: stats.table = {}
+
+    @staticmethod
+    def start() -> float:
+        # 0 when disabled, so stop() returns right away
+        return stats.enabled and time.perf_counter() or 0.0
+
+    @staticmethod
+    def stop(stage: str, t: float, bytes_in: int = 0, bytes_out: int = 0) -> None:
+        if not t: return
+        elapsed = time.perf_counter() - t
+        with stats.lock:
+            row = stats.table.setdefault(stage, [0.0, 0, 0, 0])
+            row[0] += elapsed; row[1] += 1; row[2] += bytes_in; row[3] += bytes_out
+
+    @staticmethod
+    def report() -> dict[str, dict[str, float | int]]:
+        with stats.lock:
+            return {stage: {'seconds': s, 'calls': c, 'bytes_in': i, 'bytes_out': o} for stage, (s, c, i, o) in stats.table.items()}
+
+    @staticmethod
+    def show(path: str | None = None) -> None:
+        # JSON to path, or a table on the terminal sorted by time
+        report = stats.report()
+        if path is not None:
+            with open(path, 'w') as f: json.dump(report, f, indent=2)
+            return
+        terminal(f'{"Stage":<24}{"Seconds":>12}{"Calls":>10}{"Avg ms":>10}{"MiB in":>10}{"MiB out":>10}')
+        for stage, r in sorted(report.items(), key=lambda x: -x[1]['seconds']):
+            terminal(f'{stage:<24}{r['seconds']:>12.3f}{r['calls']:>10}{r['seconds']/r['calls']*1000:>10.3f}{r['bytes_in']/2**20:>10.2f}{r['bytes_out']/2**20:>10.2f}')
@@ -0,0 +1,68 @@
+from ..common import variables
+import io, mmap, os
+
+class sync:
+    @staticmethod
+    def frames(file: io.BufferedReader, chunk: int = 2**20):
+        # Yields the offset of every Audio Stream Frame from the current position, leaving the file right after its signature.
+        # The caller reads the frame itself, and scanning resumes from wherever it left the file.
+        sign = variables.FRM_SIGN
+        while True:
+            pos = file.tell()
+            head = file.read(4)
+            if head == sign:
+                yield pos
+                continue
+            if len(head) < 4: return
+
+            # Out of sync, memory-mapped files are searched in place
+            if isinstance(file, mapped):
+                if (i := file.find(sign, pos + 1)) == -1: return
+                file.seek(i + 4)
+                yield i
+                continue
+
+            # searching the next signature a chunk at a time instead of shifting byte by byte
+            base, buf = pos + 1, head[1:]
+            while (i := buf.find(sign)) == -1:
+                data = file.read(chunk)
+                if not data: return
+                keep = buf[-3:]
+                base, buf = base + len(buf) - len(keep), keep + data
+            file.seek(base + i + 4)
+            yield base + i
+
+class mapped:
+    # Read-only memory map of a file, reads return memoryview slices into the mapping instead of copies
+    # Slices stay valid only until close(), so they should not be kept past the frame they were read for
+    def __init__(self, file: io.BufferedReader):
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.pos = 0
+
+    @staticmethod
+    def open(file: io.BufferedReader) -> 'mapped | io.BufferedReader':
+        # Falling back to the file itself where it cannot be mapped, e.g. empty files or pipes
+        try: return os.fstat(file.fileno()).st_size and mapped(file) or file
+        except (OSError, ValueError, io.UnsupportedOperation): return file
+
+    def read(self, size: int = -1) -> memoryview:
+        end = size < 0 and len(self.view) or min(self.pos + size, len(self.view))
+        data = self.view[self.pos:max(end, self.pos)]
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.pos = max((0, self.pos, len(self.view))[whence] + offset, 0)
+        return self.pos
+
+    def tell(self) -> int: return self.pos
+    def find(self, sub: bytes, start: int = 0) -> int: return self.map.find(sub, start)
+
+    def close(self) -> None:
+        # Arrays still viewing the mapping keep it alive until they are collected
+        try: self.view.release(); self.map.close()
+        except BufferError: pass
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
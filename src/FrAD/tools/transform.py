@@ -0,0 +1,28 @@
+from scipy.fft import dct, idct
+import numpy as np
+import threading
+
+class transform:
+    # scipy.fft worker threads, None for scipy default
+    workers: int | None = None
+    scratch = threading.local()
+
+    @staticmethod
+    def buffer(shape: tuple[int, ...]) -> np.ndarray:
+        # Per-thread staging buffers keyed by shape, as frame sizes repeat throughout a stream
+        buffers: dict = transform.scratch.__dict__
+        if shape not in buffers:
+            if len(buffers) >= 32: buffers.clear()
+            buffers[shape] = np.empty(shape)
+        return buffers[shape]
+
+    @staticmethod
+    def dct(pcm: np.ndarray, scale: float = 1, **kwargs) -> np.ndarray:
+        # pcm in [samples, channels] or [frames, samples, channels], all transformed along the sample axis in one call
+        if scale != 1: pcm = np.multiply(pcm, scale, out=transform.buffer(pcm.shape))
+        return dct(pcm, axis=-2, workers=kwargs.get('workers', transform.workers))
+
+    @staticmethod
+    def idct(freqs: np.ndarray, scale: float = 1, **kwargs) -> np.ndarray:
+        if scale != 1: freqs = np.multiply(freqs, scale, out=transform.buffer(freqs.shape))
+        return idct(freqs, axis=-2, workers=kwargs.get('workers', transform.workers))
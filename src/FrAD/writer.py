@@ -0,0 +1,91 @@
+from .common import variables
+from .encoder import encode
+import io
+import numpy as np
+from .tools.headb import headb, frameindex
+
+class writer:
+    # In-process encoder, takes PCM chunks of any length and writes FrAD to a path or a binary file-like object
+    def __init__(self, file: str | io.BufferedWriter, srate: int, channels: int, bits: int, **kwargs):
+        # FrAD data specification, same keywords as encode.enc
+        self.fsize: int = kwargs.get('fsize', 2048)
+        self.little_endian: bool = kwargs.get('le', False)
+        self.profile: int = kwargs.get('prf', 0)
+        self.loss_level: int = kwargs.get('lv', 0)
+        self.compression: str | None = kwargs.get('comp', None)
+        self.overlap: int = encode.overlap_rate(kwargs.get('olap', variables.overlap_rate))
+        self.gain: float = kwargs.get('gain', 1)
+
+        # ECC settings
+        self.apply_ecc: bool = kwargs.get('ecc', False)
+        self.ecc_dsize, self.ecc_codesize = map(int, kwargs.get('ecc_sizes', [96, 24]))
+
+        # Transform workers, None for scipy default
+        self.workers: int | None = kwargs.get('workers', None)
+
+        if bits not in variables.bit_depths[self.profile]: raise ValueError(f'Invalid bit depth {bits} for Profile {self.profile}')
+        if not 20 >= self.loss_level >= 0: raise ValueError(f'Invalid compression level: {self.loss_level} Lossy compression level should be between 0 and 20.')
+        variables.p1.method(self.compression)
+        if self.profile in [1, 2]:
+            if srate not in variables.p1.srates: raise ValueError(f'Sample rate {srate} is not supported by Profile {self.profile}, use one of {variables.p1.srates}')
+            self.fsize = min((x for x in variables.p1.smpls_li if x >= self.fsize), default=2048)
+        self.srate, self.channels, self.bits = srate, channels, bits
+
+        self.owned = isinstance(file, str)
+        self.file: io.BufferedWriter = self.owned and open(file, 'wb') or file
+        self.buffer, self.prev = np.zeros((0, channels)), np.array([])
+
+        # Header, a bare stream if container=False
+        # The frame index needs a seekable output, and is placed relative to wherever the file object is positioned
+        self.index = None
+        if kwargs.get('container', True):
+            index_interval: int | None = kwargs.get('index', None)
+            # Length is unknown, the interval grows once the reserved entries run out
+            if index_interval and self.file.seekable(): self.index = frameindex(capacity=kwargs.get('index_capacity', 8192), interval=index_interval)
+            start = self.index is not None and self.file.tell() or 0
+            self.file.write(headb.uilder(kwargs.get('meta', None), kwargs.get('img', None), self.index, kwargs.get('padding', 0)))
+            if self.index is not None: self.index.position += start; self.index.base += start
+
+    def rlen(self) -> int:
+        # Samples to read for the next frame, as encode.enc does
+        if self.profile != 1: return self.fsize
+        rlen = min((x-len(self.prev) for x in variables.p1.smpls_li if x >= self.fsize))
+        if rlen <= 0: rlen = min((x-len(self.prev) for x in variables.p1.smpls_li if x-len(self.prev) >= self.fsize))
+        return rlen
+
+    def write(self, pcm: np.ndarray) -> None:
+        # pcm in [samples, channels] or interleaved, floats in -1 to 1
+        pcm = np.asarray(pcm, float).reshape(-1, self.channels) * self.gain
+        self.buffer = np.concatenate([self.buffer, pcm])
+        frames = []
+        while len(self.buffer) >= (rlen := self.rlen()):
+            frame, self.prev = encode.overlap(self.buffer[:rlen], self.prev, self.overlap, self.profile)
+            self.buffer = self.buffer[rlen:]
+            frames.append(frame)
+        # Profile 0 frames are transformed 8 at a time, as encode.enc does
+        for i in range(0, len(frames), 8): self.encode(frames[i:i+8])
+
+    def encode(self, frames: list[np.ndarray]) -> None:
+        if not frames: return
+        ecc_sizes = self.apply_ecc and (self.ecc_dsize, self.ecc_codesize) or None
+        for frame, _, channels_frame, bits_pfb, flen in encode.frames(frames, self.bits, self.channels, self.little_endian, self.profile, self.srate, self.loss_level, self.workers, ecc_sizes, self.compression):
+            pfb = headb.encode_pfb(self.profile, self.apply_ecc, self.little_endian, bits_pfb)
+            encode.write_frame(self.file, frame, channels_frame, self.srate, pfb, (self.ecc_dsize, self.ecc_codesize), flen, olap=self.overlap, index=self.index)
+
+    def close(self) -> None:
+        # Encoding the remaining samples as a shorter last frame and filling in the index
+        if self.file.closed: return
+        if len(self.buffer):
+            frame, self.prev = encode.overlap(self.buffer, self.prev, self.overlap, self.profile)
+            self.buffer = self.buffer[:0]
+            self.encode([frame])
+        if self.index is not None:
+            end = self.file.tell()
+            self.file.seek(self.index.position)
+            self.file.write(self.index.tobytes())
+            self.file.seek(end)
+        self.file.flush()
+        if self.owned: self.file.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
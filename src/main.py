@@ -1,4 +1,4 @@
-import base64, json, os, sys, traceback
+import atexit, base64, json, os, sys, traceback
 
 def terminal(*args: object, sep: str | None = ' ', end: str | None = '\n'):
     sys.stderr.buffer.write(f'{(sep or '').join(map(str,args))}{end}'.encode())
@@ -41,7 +41,18 @@ fourier encode path/to/audio.file --bits [bit depth] {{kwargs...}}
                   |
     --profile     | FrAD Profile from 0 to 7, NOT RECOMMENDED (alias: prf)
     --loss-level  | Lossy compression level, default: 0 (alias: lv, level)
+    --compression | Profile 1 compression, none, zlib, lzma or bz2 with an
+                  | optional :level, or a preset: fast, balanced, max
+                  | default: balanced (alias: comp)
                   |
+    --index       | Write a frame index for seeking, one entry per [N] frames
+                  | default: 1 (alias: idx)
+    --padding     | Reserve [N] header bytes for editing metadata in place
+                  | default: 0 (alias: pad)
+    --threads     | Encode frames on [N] worker threads (alias: t)
+    --processes   | Encode frames on [N] worker processes (alias: p)
+    --stats       | Time spent per stage, printed or written to a [path] as JSON
+                  |                                (alias: profile-stages)
     --verbose     | Verbose output (alias: v)'''
 decode_help = f'''--------------------------------- Description ----------------------------------
 
@@ -58,6 +69,14 @@ fourier decode path/to/audio.file {{kwargs...}} {{--ffmpeg {{ffmpeg decode comma
     --ecc         | Check errors and fix, recommended.
                   |                            (alias: e, apply-ecc, enable-ecc)
     --gain        | Gain level in both dBFS and amplitude (alias: g)
+    --mmap        | Memory-map the file and decode frames in place
+                  |                                       (alias: memory-map)
+    --start       | Decode from [seconds] (alias: s)
+    --end         | Decode up to [seconds] (alias: to)
+    --threads     | Decode frames on [N] worker threads (alias: t)
+    --processes   | Decode frames on [N] worker processes (alias: p)
+    --stats       | Time spent per stage, printed or written to a [path] as JSON
+                  |                                (alias: profile-stages)
     --verbose     | Verbose output (alias: v)
                   |
     --ffmpeg      | Pass a custom FFmpeg command for decoding.
@@ -84,6 +103,9 @@ This action will play FrAD files, not decoding to any other format.
     --speed       | Playback speed, exclusive with --keys (alias: spd)
     --ecc         | Check errors and fix while playback
                   |                            (alias: e, apply-ecc, enable-ecc)
+    --lookahead   | Seconds decoded ahead of the device, default: 0.5
+                  |                                              (alias: buffer)
+    --mmap        | Memory-map the input file (alias: memory-map)
     --verbose     | Verbose output (alias: v)'''
 record_help = f'''--------------------------------- Description ----------------------------------
 
@@ -103,7 +125,18 @@ This action will capture audio stream and write directly to FrAD file.
     --overlap     | Overlap ratio in 1/{{value}} (alias: olap)
                   |
     --profile     | FrAD Profile from 0 to 7, NOT RECOMMENDED (alias: prf)
-    --loss-level  | Lossy compression level (alias: lv, level)'''
+    --loss-level  | Lossy compression level (alias: lv, level)
+    --compression | Profile 1 compression, none, zlib, lzma or bz2 with an
+                  | optional :level, or a preset: fast, balanced, max
+                  | default: balanced (alias: comp)
+                  |
+    --index       | Write a frame index for seeking, one entry per [N] frames
+                  | default: 1 (alias: idx)
+    --padding     | Reserve [N] header bytes for editing metadata in place
+                  | default: 0 (alias: pad)
+    --stats       | Time spent per stage, printed or written to a [path] as JSON
+                  |                                (alias: profile-stages)
+    --verbose     | Verbose output (alias: v)'''
 repack_ecc_help = f'''--------------------------------- Description ----------------------------------
 
 Repack
@@ -114,6 +147,13 @@ errors.
 
     --ecc         | ECC size ratio in --ecc [data size] [ecc code size]
                   | default: 96, 24 (alias: e, apply-ecc, enable-ecc)
+    --strip       | Fix errors and remove ECC protection (alias: strip-ecc, no-ecc)
+    --threads     | Repack frames on [N] worker threads (alias: t)
+    --processes   | Repack frames on [N] worker processes (alias: p)
+    --index       | Only add a frame index for seeking, one entry per [N] frames
+                  | default: 1 (alias: idx)
+    --stats       | Time spent per stage, printed or written to a [path] as JSON
+                  |                                (alias: profile-stages)
     --verbose     | Verbose output (alias: v)'''
 meta_help = f'''--------------------------------- Description ----------------------------------
 
@@ -145,7 +185,11 @@ fourier meta {{action}} path/to/audio.file {{kwargs...}}
     --image       | Image to embed (alias: img)
 
     parse
-    --output      | Output file path (alias: o, out, output-file)'''
+    --output      | Output file path (alias: o, out, output-file)
+
+    Edits that fit in the header and its padding are written in place,
+    otherwise the file is rewritten with room for later edits.
+    --padding     | Bytes reserved on rewrite, default: 4096 (alias: pad)'''
 update_help = f'''--------------------------------- Description ----------------------------------
 
 Update
@@ -154,9 +198,27 @@ This action will update Fourier Analogue-in-Digital from the repository.
 ----------------------------------- Options ------------------------------------
 
     No option for this action.'''
+bench_help = f'''--------------------------------- Description ----------------------------------
+
+Bench
+This action will time every encode and decode stage on synthetic signals,
+writing the results in JSON to the given path, or to stdout with -.
+ffmpeg and audio devices are not needed.
+
+----------------------------------- Options ------------------------------------
+
+    --baseline    | Results JSON to compare with, exits with 1 on regressions
+                  |                                                (alias: base)
+    --tolerance   | Slowdown ratio allowed before flagging a regression,
+                  |                                 default: 0.25 (alias: tol)
+    --repeat      | Least timed runs per case, the fastest is reported
+                  | and a regression needs every run slower, at least 3
+                  | with --baseline                default: 5 (alias: repeats)
+    --full        | Every frame size in Profile 1 instead of a subset
+    --verbose     | Verbose output (alias: v)'''
 
 def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
-    from FrAD.tools.argparse import encode_opt, decode_opt, play_opt, record_opt, meta_opt, repack_ecc_opt, update_opt
+    from FrAD.tools.argparse import encode_opt, decode_opt, play_opt, record_opt, meta_opt, repack_ecc_opt, update_opt, bench_opt
 
     le = kwargs.get('le', False)
     fsize = kwargs.get('fsize', 2048)
@@ -168,6 +230,14 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
 
     gain = kwargs.get('gain', 1)
 
+    # Per-stage timing, True to print the table, a path to dump JSON
+    # Reported at exit, as most actions leave through sys.exit
+    show_stats = kwargs.get('stats', None)
+    if show_stats:
+        from FrAD.tools.stats import stats
+        stats.enable()
+        atexit.register(stats.show, show_stats is not True and show_stats or None)
+
     output = kwargs.get('output', None)
     verbose = kwargs.get('verbose', False)
 
@@ -198,11 +268,12 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
         from FrAD import encode
         encode.enc(
                 file_path, kwargs['bits'], le=le,
-                out=output, prf=profile, lv=loss_level,
+                out=output, prf=profile, lv=loss_level, comp=kwargs.get('compression', None),
                 fsize=fsize, gain=gain, ecc=ecc_enabled, ecc_sizes=data_ecc,
                 srate=srate, chnl=kwargs.get('chnl', None),
                 raw=kwargs.get('raw', None), olap=kwargs.get('overlap', None),
-                meta=meta, img=img, verbose=verbose)
+                meta=meta, img=img, index=kwargs.get('index', None), padding=kwargs.get('padding', 0),
+                threads=kwargs.get('threads', 0), processes=kwargs.get('processes', 0), verbose=verbose)
 
     elif action in decode_opt:
         if file_path is None: terminal('File path is required.'); sys.exit(1)
@@ -214,7 +285,9 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
                 codec=kwargs.get('codec', 'flac'),
                 quality=kwargs.get('quality', None),
                 ecc=ecc_enabled, gain=gain, srate=srate,
-                verbose=verbose)
+                mmap=kwargs.get('mmap', False), threads=kwargs.get('threads', 0),
+                start=kwargs.get('start', None), end=kwargs.get('end', None),
+                processes=kwargs.get('processes', 0), verbose=verbose)
 
     elif action in play_opt:
         if file_path is None: terminal('File path is required.'); sys.exit(1)
@@ -222,7 +295,9 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
         player.play(
                 file_path, gain, kwargs.get('keys', None),
                 kwargs.get('speed', None),
-                ecc_enabled, verbose)
+                ecc_enabled, verbose,
+                lookahead=kwargs.get('lookahead', 0.5),
+                mmap=kwargs.get('mmap', False))
 
     elif action in record_opt:
         if file_path is None: terminal('File path is required.'); sys.exit(1)
@@ -232,14 +307,16 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
             srate=kwargs.get('srate', 48000),
             bits=bits, fsize=fsize, olap=kwargs.get('overlap', None),
             ecc=ecc_enabled, ecc_sizes=data_ecc,
-            prf=profile, lv=loss_level, le=le)
+            prf=profile, lv=loss_level, comp=kwargs.get('compression', None), le=le, index=kwargs.get('index', None), padding=kwargs.get('padding', 0),
+            verbose=verbose)
 
     elif action in meta_opt:
         from FrAD import header
-        if metaopt=='add': header.modify(file_path, meta=meta, img=img, add=True)
-        elif metaopt=='rm': header.modify(file_path, meta=kwargs.get('meta-key', None), remove=True)
-        elif metaopt=='write-img': header.modify(file_path, img=img, write_img=True)
-        elif metaopt=='rm-img': header.modify(file_path, remove_img=True)
+        padding = kwargs.get('padding', 4096)
+        if metaopt=='add': header.modify(file_path, meta=meta, img=img, add=True, padding=padding)
+        elif metaopt=='rm': header.modify(file_path, meta=kwargs.get('meta-key', None), remove=True, padding=padding)
+        elif metaopt=='write-img': header.modify(file_path, img=img, write_img=True, padding=padding)
+        elif metaopt=='rm-img': header.modify(file_path, remove_img=True, padding=padding)
 
         elif metaopt=='overwrite':
             terminal('This action will overwrite all metadata and image. if nothing provided, it will be removed. Proceed? (Y/N)')
@@ -248,19 +325,27 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
                 x = input().lower()
                 if x == 'y': break
                 if x == 'n': sys.exit('Aborted.')
-            header.modify(file_path, meta=meta, img=img)
+            header.modify(file_path, meta=meta, img=img, padding=padding)
         elif metaopt=='parse': header.parse(file_path, kwargs.get('output', 'metadata'))
         else: terminal('Invalid meta option.'); sys.exit(1)
 
     elif action in repack_ecc_opt:
         if file_path is None: terminal('File path is required.'); sys.exit(1)
         from FrAD import repack
-        repack.ecc(file_path, data_ecc, verbose)
+        if kwargs.get('index', None) is not None: repack.index(file_path, kwargs['index'], verbose)
+        else: repack.ecc(file_path, data_ecc, verbose, strip=kwargs.get('strip', False),
+                threads=kwargs.get('threads', 0), processes=kwargs.get('processes', 0))
 
     elif action in update_opt:
         from FrAD.tools import update
         update.fetch_git(os.path.dirname(__file__))
 
+    elif action in bench_opt:
+        from FrAD.tools.bench import bench
+        sys.exit(bench.main(file_path,
+            baseline=kwargs.get('baseline', None), tolerance=kwargs.get('tolerance', 0.25),
+            repeat=kwargs.get('repeat', 5), full=kwargs.get('full', False), verbose=verbose))
+
     elif action in ['help']:
         terminal(
 '''               Fourier Analogue-in-Digital Master encoder/decoder
@@ -273,6 +358,7 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
         elif file_path in meta_opt:       terminal(meta_help)
         elif file_path in repack_ecc_opt: terminal(repack_ecc_help)
         elif file_path in update_opt:     terminal(update_help)
+        elif file_path in bench_opt:      terminal(bench_help)
         else:
             terminal(
 '''------------------------------- Available actions ------------------------------
@@ -283,7 +369,8 @@ def main(action: str, file_path: str | None, metaopt: str | None, kwargs: dict):
     record | Direct Software FrAD recording   (alias: rec)
     repack | Enable/Repack ECC protection     (alias: ecc)
     meta   | Edit metadata on FrAD            (alias: metadata)
-    update | Update FrAD codec from Github''')
+    update | Update FrAD codec from Github
+    bench  | Time codec stages offline        (alias: benchmark)''')
         terminal()
     else:
         terminal(f'Invalid action "{action}", type `fourier help` to get help.')
@@ -0,0 +1,38 @@
+import os, sys, unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD.common import methods
+from FrAD.tools.crc import crc16
+
+class test_crc(unittest.TestCase):
+    # Chunked CRC-16/ANSI against the plain bitwise definition
+
+    def reference(self, data: bytes) -> int:
+        crc = 0
+        for b in data:
+            crc ^= b
+            for _ in range(8): crc = crc & 1 and (crc >> 1) ^ 0xA001 or crc >> 1
+        return crc
+
+    def test_known(self):
+        self.assertEqual(crc16.ansi(b'123456789'), 0xBB3D)
+        self.assertEqual(crc16.ansi(b''), 0)
+        self.assertEqual(crc16.ansi(b'A'), 0x30C0)
+        self.assertEqual(crc16.ansi(bytes(1000)), 0)
+        self.assertEqual(methods.crc16_ansi(b'123456789'), 0xBB3D)
+
+    def test_lengths(self):
+        # Around every multiple of the chunk width, so the left padding and the pairwise folding both get odd counts
+        rng, w = np.random.default_rng(0), crc16.width
+        for length in (1, 2, 9, w-1, w, w+1, 2*w-1, 2*w, 2*w+1, 3*w+7, 5*w, 7*w+1, 4096, 65537):
+            data = rng.integers(0, 256, length, np.uint8).tobytes()
+            self.assertEqual(crc16.ansi(data), self.reference(data), length)
+            self.assertEqual(crc16.ansi(memoryview(data)), self.reference(data), length)
+
+    def test_leading_zeros(self):
+        # Zero init, leading zeros leave the CRC as it is
+        data = b'123456789'
+        for pad in (1, crc16.width, crc16.width+3): self.assertEqual(crc16.ansi(bytes(pad) + data), 0xBB3D)
+
+if __name__ == '__main__':
+    unittest.main()
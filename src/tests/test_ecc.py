@@ -0,0 +1,77 @@
+import os, sys, unittest
+import numpy as np
+from reedsolo import RSCodec, ReedSolomonError
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD.tools.ecc import ecc, rscode
+
+class test_ecc(unittest.TestCase):
+    # Table-driven Reed-Solomon against reedsolo block by block, as ecc did before the tables
+    sizes = ((96, 24), (128, 20), (192, 48), (5, 4))
+
+    def reference(self, data: bytes, dsize: int, codesize: int, decode: bool = False) -> bytes:
+        rs, size = RSCodec(codesize, dsize+codesize), decode and dsize+codesize or dsize
+        out = []
+        for i in range(0, len(data), size):
+            if not decode: out.append(bytes(rs.encode(data[i:i+size]))); continue
+            try: out.append(bytes(rs.decode(data[i:i+size])[0]))
+            except ReedSolomonError: out.append(b'\x00'*dsize)
+        return b''.join(out)
+
+    def damage(self, coded: bytes, blocksize: int, errors: int, seed: int = 0) -> bytes:
+        # errors bytes flipped at distinct positions of every block, fewer in a short last block
+        rng, data = np.random.default_rng(seed), bytearray(coded)
+        for i in range(0, len(data), blocksize):
+            n = min(blocksize, len(data) - i)
+            for p in rng.choice(n, min(errors, n), replace=False): data[i+p] ^= int(rng.integers(1, 256))
+        return bytes(data)
+
+    def test_known(self):
+        self.assertEqual(ecc.encode(b'hello', 5, 4), bytes(RSCodec(4, 9).encode(b'hello')))
+        self.assertEqual(ecc.encode(b'hello', 5, 4).hex(), '68656c6c6fcbbaa9ba')
+
+    def test_clean(self):
+        rng = np.random.default_rng(0)
+        for dsize, codesize in self.sizes:
+            for length in (0, 1, dsize-1, dsize, dsize+1, 7*dsize, 7*dsize + dsize//2):
+                data = rng.integers(0, 256, length, np.uint8).tobytes()
+                coded = ecc.encode(data, dsize, codesize)
+                self.assertEqual(coded, self.reference(data, dsize, codesize))
+                self.assertEqual(ecc.decode(coded, dsize, codesize), data)
+                self.assertEqual(ecc.unecc(coded, dsize, codesize), data)
+
+    def test_damaged(self):
+        # Up to codesize/2 byte errors in every block are corrected, the short last block included
+        rng = np.random.default_rng(1)
+        for dsize, codesize in self.sizes:
+            data = rng.integers(0, 256, 9*dsize + dsize//3 + 1, np.uint8).tobytes()
+            coded = ecc.encode(data, dsize, codesize)
+            for errors in range(1, codesize//2 + 1):
+                damaged = self.damage(coded, dsize+codesize, errors, errors)
+                self.assertEqual(ecc.decode(damaged, dsize, codesize), data)
+            # Past the limit the result follows reedsolo, zeroed blocks where it gives up
+            damaged = self.damage(coded, dsize+codesize, codesize//2 + 2)
+            self.assertEqual(ecc.decode(damaged, dsize, codesize), self.reference(damaged, dsize, codesize, True))
+
+    def test_truncated(self):
+        # The last block cut short, down to parity bytes only
+        rng = np.random.default_rng(2)
+        for dsize, codesize in self.sizes:
+            blocksize = dsize + codesize
+            coded = ecc.encode(rng.integers(0, 256, 4*dsize, np.uint8).tobytes(), dsize, codesize)
+            for cut in (1, codesize//2, codesize, blocksize - codesize, blocksize - 1):
+                truncated = coded[:-cut]
+                self.assertEqual(ecc.decode(truncated, dsize, codesize), self.reference(truncated, dsize, codesize, True))
+                # Data bytes carried over block by block, whatever is left of the last block before its parity
+                self.assertEqual(ecc.unecc(truncated, dsize, codesize), b''.join(truncated[i:i+blocksize][:-codesize] for i in range(0, len(truncated), blocksize)))
+
+    def test_check(self):
+        # Nonzero syndromes only for the blocks that were touched
+        code = rscode(96, 24)
+        blocks = np.random.default_rng(3).integers(0, 256, (8, 96), np.uint8)
+        coded = np.hstack([blocks, code.encode(blocks)])
+        self.assertFalse(code.check(coded).any())
+        coded[[2, 5], [0, 119]] ^= 1
+        self.assertEqual(np.flatnonzero(code.check(coded)).tolist(), [2, 5])
+
+if __name__ == '__main__':
+    unittest.main()
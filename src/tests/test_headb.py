@@ -0,0 +1,119 @@
+import os, struct, sys, tempfile, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD.tools.headb import INDEX, PADDING, frameindex, headb, metablock
+
+class test_headb(unittest.TestCase):
+    # Frame index and padding metablocks, built in memory and parsed back from files
+
+    def build(self, capacity: int = 8192, interval: int = 1) -> frameindex:
+        # 4 frames of 4800 stereo samples at 48 kHz, then 2 of 2400 mono samples at 24 kHz, all 1000 bytes from offset 64
+        index = frameindex(capacity=capacity, interval=interval, base=64)
+        for i in range(6):
+            fmt = i < 4 and (4800, 48000, 2) or (2400, 24000, 1)
+            index.add(64 + i*1000, 1000, *fmt)
+        return index
+
+    def write(self, data: bytes) -> str:
+        path = os.path.join(tempfile.mkdtemp(), 'head.frad')
+        with open(path, 'wb') as f: f.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_index_roundtrip(self):
+        index = self.build()
+        block = index.tobytes()
+        self.assertEqual(block[:2], INDEX)
+        self.assertEqual(int.from_bytes(block[2:8], 'big'), len(block))
+        self.assertEqual(len(block), 16 + frameindex.entry.size * (index.capacity+1))
+
+        parsed = frameindex.frombytes(block[8:])
+        self.assertEqual(parsed.entries, index.entries)
+        self.assertEqual((parsed.capacity, parsed.interval), (index.capacity, index.interval))
+        self.assertEqual((parsed.frames, parsed.end, parsed.samples, parsed.format), (6, 6000, 24000, (24000, 1)))
+        self.assertEqual(parsed.entries[4], (4, 4000, 19200, 24000, 1))
+        self.assertEqual(parsed.tobytes(), block)
+
+    def test_index_overlap(self):
+        # Overlapping tails are held back until the next frame and counted at the end of stream
+        index = frameindex()
+        for i in range(3): index.add(i*100, 100, 2048, 48000, 2, 16)
+        self.assertEqual([e[2] for e in index.entries], [0, 1920, 3840])
+        parsed = frameindex.frombytes(index.tobytes()[8:])
+        self.assertEqual(parsed.samples, 3*2048 - 2*128)
+
+    def test_index_locate(self):
+        index = frameindex.frombytes(self.build().tobytes()[8:])
+        self.assertEqual([round(t, 9) for t in index.times], [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        self.assertAlmostEqual(index.duration, 0.6)
+        self.assertEqual(index.locate(0.0)[0], 0)
+        self.assertEqual(index.locate(0.25)[0], 2)
+        self.assertEqual(index.locate(0.4)[0], 4)
+        self.assertEqual(index.locate(-1)[0], 0)
+        self.assertEqual(index.locate(10)[0], 5)
+        self.assertEqual(index.locate_frame(3)[0], 3)
+        self.assertEqual(index.locate_sample(19199)[0], 3)
+        self.assertEqual(index.locate_sample(19200, before=1)[0], 3)
+        # 0.45 s is 1200 samples into the 24 kHz part
+        self.assertEqual(index.sample(0.45), 19200 + 1200)
+        self.assertIsNone(frameindex().locate(0))
+
+    def test_index_decimate(self):
+        # 4 entries at most, the format change at frame 5 is kept whatever the interval
+        index = frameindex(capacity=4)
+        for i in range(40): index.add(i*10, 10, 1024, i < 5 and 48000 or 44100, 2)
+        self.assertLessEqual(len(index.entries), 4)
+        self.assertEqual(index.interval, 16)
+        self.assertEqual([e[0] for e in index.entries], [0, 5, 16, 32])
+        parsed = frameindex.frombytes(index.tobytes()[8:])
+        self.assertEqual(parsed.entries, index.entries)
+        self.assertEqual(parsed.locate_frame(20)[0], 16)
+
+    def test_index_dropped(self):
+        # More format changes than the capacity holds, the index is left empty
+        index = frameindex(capacity=2)
+        for i in range(4): index.add(i*10, 10, 1024, (48000, 44100)[i%2], 2)
+        self.assertTrue(index.dropped)
+        block = index.tobytes()
+        self.assertEqual(struct.unpack('>II', block[8:16])[1], 0)
+        parsed = frameindex.frombytes(block[8:])
+        self.assertEqual(parsed.entries, [])
+        self.assertIsNone(parsed.locate(0))
+
+    def test_padding(self):
+        self.assertEqual(metablock.padding(32), PADDING + (32).to_bytes(6, 'big') + bytes(24))
+        # Never shorter than its own block header
+        self.assertEqual(metablock.padding(0), PADDING + (8).to_bytes(6, 'big'))
+
+    def test_container(self):
+        # Comments, cover art, index and padding in one header, parsed back from a file
+        meta, img = [['title', 'Index'], ['artist', 'FrAD']], b'\x89PNG' + bytes(100)
+        index = self.build()
+        head = headb.uilder(meta, img, index, padding=256)
+        self.assertEqual(struct.unpack('>Q', head[8:16])[0], len(head))
+        self.assertEqual(head[-256:], metablock.padding(256))
+        self.assertEqual(head[index.position:index.position+2], INDEX)
+        self.assertEqual(index.base, len(head))
+
+        path = self.write(head + bytes(6000))
+        parsed_meta, parsed_img = headb.parser(path)
+        self.assertEqual([m[:2] for m in parsed_meta], meta)
+        self.assertEqual(parsed_img, img)
+        self.assertEqual(headb.parser(path, lazy=True)[1].read(), img)
+
+        parsed = headb.parse_index(path)
+        self.assertEqual(parsed.entries, index.entries)
+        self.assertEqual((parsed.position, parsed.base), (index.position, len(head)))
+
+        # Patching in place keeps the header length and the blocks around the index
+        for i in range(6, 8): parsed.add(len(head) + i*1000, 1000, 2400, 24000, 1)
+        parsed.patch(path)
+        self.assertEqual(os.path.getsize(path), len(head) + 6000)
+        self.assertEqual(headb.parse_index(path).entries, parsed.entries)
+        self.assertEqual(headb.parser(path)[1], img)
+
+        # No index block, or not a container
+        self.assertIsNone(headb.parse_index(self.write(headb.uilder(meta, padding=64))))
+        self.assertIsNone(headb.parse_index(self.write(b'\xff\xd0\xd2\x97' + bytes(60))))
+
+if __name__ == '__main__':
+    unittest.main()
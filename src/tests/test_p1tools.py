@@ -0,0 +1,48 @@
+import os, sys, unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD.profiles.tools import p1tools
+
+class test_p1tools(unittest.TestCase):
+    # Exponential Golomb-Rice layouts, single k and per-block k, and the older interleaved ones
+
+    def roundtrip(self, data: np.ndarray, block: int = 0) -> bytes:
+        coded = p1tools.exp_golomb_rice_encode(data, block)
+        self.assertTrue(np.array_equal(p1tools.exp_golomb_rice_decode(coded, len(data)), data))
+        return coded
+
+    def test_single(self):
+        # Every block would take the same k as the whole stream, the per-block header only adds to it
+        data = np.random.default_rng(0).integers(-1, 2, 8192)
+        single = self.roundtrip(data)
+        self.assertEqual(single[0], 0x40)
+        self.assertEqual(self.roundtrip(data, p1tools.block), single)
+
+    def test_adaptive(self):
+        # Loud low band and a near-silent rest, a k per block comes out smaller
+        rng = np.random.default_rng(1)
+        data = np.concatenate([rng.integers(-2**12, 2**12, 256), rng.integers(-1, 2, 8192-256)])
+        single = self.roundtrip(data)
+        adaptive = self.roundtrip(data, p1tools.block)
+        self.assertEqual(adaptive[0], 0xc0)
+        self.assertEqual(int.from_bytes(adaptive[1:3], 'big'), p1tools.block)
+        self.assertLess(len(adaptive), len(single))
+
+    def test_edges(self):
+        rng = np.random.default_rng(2)
+        for length in (1, 255, 256, 257, 5000):
+            for block in (0, 7, p1tools.block):
+                self.roundtrip(rng.integers(-1000, 1001, length), block)
+                self.roundtrip(np.zeros(length, dtype=np.int64), block)
+        # Codewords longer than the 64-bit read window
+        self.roundtrip(np.array([0, 2**61, -2**61, 1, -1]))
+        self.roundtrip(np.concatenate([np.zeros(300, dtype=np.int64), [2**61, -2**61], np.ones(300, dtype=np.int64)]), 256)
+
+    def test_interleaved(self):
+        # 0, 1 and -1 with k = 0, codewords 1, 010 and 011 back to back
+        self.assertEqual(p1tools.exp_golomb_rice_decode(b'\x00\xa6').tolist(), [0, 1, -1])
+        # The same as one block of 7 bits with its k
+        self.assertEqual(p1tools.exp_golomb_rice_decode(b'\x80\x00\x00\x00\x01\x00\x00\x07\xa6').tolist(), [0, 1, -1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os, sys, tempfile, threading, unittest
+from functools import partial
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD import player, writer
+from FrAD.tools.playback import nullstream, playback
+
+class test_playback(unittest.TestCase):
+    # Playback against the nullstream stand-in, no audio device involved
+    timeout = 20
+
+    def run_with_timeout(self, fn):
+        result, done = [], threading.Event()
+        def target():
+            try: result.append(fn())
+            finally: done.set()
+        threading.Thread(target=target, daemon=True).start()
+        self.assertTrue(done.wait(self.timeout), 'playback did not finish')
+        return result[0]
+
+    def test_blocks_larger_than_ring(self):
+        # 2048-sample blocks into a 96-sample ring
+        srate, channels = 48000, 2
+        blocks = [np.full((2048, channels), i+1, np.float32) for i in range(8)]
+        streams = []
+        def output(**kwargs):
+            streams.append(nullstream(capture=True, **kwargs))
+            return streams[-1]
+        pb = playback(iter([(b, srate, channels) for b in blocks]), output, lookahead=0.002).start()
+        self.run_with_timeout(lambda: pb.wait(self.timeout))
+        played = np.concatenate(streams[0].captured)
+        played = played[np.any(played != 0, axis=1)]
+        self.assertTrue(np.array_equal(played, np.concatenate(blocks)))
+        self.assertEqual(pb.counters()['played'], sum(map(len, blocks)))
+
+    def test_player_small_lookahead(self):
+        # Profile 1 frames of 2048 samples against a 960-sample ring
+        path = os.path.join(tempfile.mkdtemp(), 'small.frad')
+        t = np.arange(48000) / 48000
+        w = writer(path, 48000, 2, 16, prf=1, lv=5)
+        w.write(np.stack([0.5*np.sin(2*np.pi*440*t), 0.5*np.sin(2*np.pi*880*t)], 1))
+        w.close()
+        try:
+            stats = self.run_with_timeout(lambda: player.play(path, 1, lookahead=0.02, output=partial(nullstream, capture=True)))
+            self.assertGreaterEqual(stats['played'], 48000)
+            self.assertEqual(stats['streams'], 1)
+        finally: os.remove(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import io, os, shutil, sys, tempfile, unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FrAD import decode, reader, repack, writer
+
+class capture(io.BytesIO):
+    # decode.internal sink, keeping each segment as [samples, channels] once it is closed
+    def __init__(self, segments: list, srate: int, channels: int):
+        super().__init__()
+        self.segments, self.srate, self.channels = segments, srate, channels
+
+    def close(self):
+        if not self.closed: self.segments.append((np.frombuffer(self.getvalue(), '>f8').reshape(-1, self.channels), self.srate, self.channels))
+        super().close()
+
+class test_reader(unittest.TestCase):
+    # Ranges decoded by reader and decode.internal against slices of the whole stream,
+    # on Profile 1 with overlap, stereo 48 kHz then mono 24 kHz, with and without a frame index
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        plain = os.path.join(cls.dir, 'plain.frad')
+        t = np.arange(24000) / 48000
+        with writer(plain, 48000, 2, 16, prf=1, lv=5) as w:
+            w.write(np.stack([0.5*np.sin(2*np.pi*440*t), 0.5*np.sin(2*np.pi*660*t)], 1))
+        t = np.arange(12000) / 24000
+        with open(plain, 'ab') as f, writer(f, 24000, 1, 16, prf=1, lv=5, container=False) as w:
+            w.write(0.5*np.sin(2*np.pi*220*t))
+        indexed = os.path.join(cls.dir, 'indexed.frad')
+        shutil.copy(plain, indexed)
+        repack.index(indexed)
+        cls.paths = plain, indexed
+
+        # The whole stream decoded frame after frame from the start, one array per format
+        with reader(plain) as r:
+            r.f.seek(r.head_len)
+            blocks = list(decode.blocks(r.f, False, 1))
+        cls.formats = [(48000, 2), (24000, 1)]
+        cls.segments = [np.concatenate([b[0] for b in blocks if b[1:] == fmt]) for fmt in cls.formats]
+        cls.total = sum(map(len, cls.segments))
+
+    @classmethod
+    def tearDownClass(cls): shutil.rmtree(cls.dir)
+
+    def internal(self, path: str, **kwargs) -> list:
+        segments = []
+        decode.internal(path, sink=lambda srate, channels: capture(segments, srate, channels), **kwargs)
+        return [s for s in segments if len(s[0])]
+
+    def test_whole(self):
+        for path in self.paths:
+            with reader(path) as r:
+                self.assertEqual(r.samples, self.total)
+                self.assertAlmostEqual(r.duration, len(self.segments[0])/48000 + len(self.segments[1])/24000)
+            got = self.internal(path)
+            self.assertEqual([s[1:] for s in got], self.formats)
+            for (pcm, _, _), ref in zip(got, self.segments): self.assertTrue(np.array_equal(pcm, ref))
+
+    def test_frame_boundary(self):
+        # Across the second and third frame boundaries, where overlapping tails are crossfaded in
+        for path in self.paths:
+            with reader(path) as r:
+                for entry in r.index.entries[1:3]:
+                    pcm, srate, channels = r.read(entry[2]-100, entry[2]+100)
+                    self.assertEqual((srate, channels), (48000, 2))
+                    self.assertTrue(np.array_equal(pcm, self.segments[0][entry[2]-100:entry[2]+100]))
+                r.seek(entry[2]-1)
+                self.assertTrue(np.array_equal(r.read(stop=entry[2]+1)[0], self.segments[0][entry[2]-1:entry[2]+1]))
+                self.assertEqual(r.tell(), entry[2]+1)
+
+            # The same range in seconds, at 48 kHz
+            got = self.internal(path, start=(entry[2]-100)/48000, end=(entry[2]+100)/48000)
+            self.assertEqual(len(got), 1)
+            self.assertTrue(np.array_equal(got[0][0], self.segments[0][entry[2]-100:entry[2]+100]))
+
+    def test_format_change(self):
+        # Stereo 48 kHz into mono 24 kHz, one block or segment on each side
+        split = len(self.segments[0])
+        for path in self.paths:
+            with reader(path) as r:
+                with self.assertRaises(ValueError): r.read(split-10, split+10)
+                blocks = list(r.blocks(split-10, split+10))
+                self.assertEqual([b[1:] for b in blocks], self.formats)
+                self.assertTrue(np.array_equal(blocks[0][0], self.segments[0][-10:]))
+                self.assertTrue(np.array_equal(blocks[1][0], self.segments[1][:10]))
+                pcm, srate, channels = r.read(split, split+500)
+                self.assertEqual((srate, channels), (24000, 1))
+                self.assertTrue(np.array_equal(pcm, self.segments[1][:500]))
+
+            # 10 ms before and after the change, as samples of each side's own rate
+            start = split/48000
+            got = self.internal(path, start=start-0.01, end=start+0.01)
+            self.assertEqual([s[1:] for s in got], self.formats)
+            self.assertTrue(np.array_equal(got[0][0], self.segments[0][-480:]))
+            self.assertTrue(np.array_equal(got[1][0], self.segments[1][:240]))
+
+    def test_empty_ranges(self):
+        for path in self.paths:
+            # end=0 is an empty range, not an open one
+            self.assertEqual(self.internal(path, end=0), [])
+            self.assertEqual(self.internal(path, start=0.2, end=0.1), [])
+            # Starting at or past the end of the stream
+            with reader(path) as r:
+                self.assertEqual(self.internal(path, start=r.duration), [])
+                self.assertEqual(self.internal(path, start=r.duration+5), [])
+                for start in (r.samples, r.samples+1000):
+                    pcm, srate, channels = r.read(start, start+100)
+                    self.assertEqual(pcm.shape, (0, 1))
+                    self.assertEqual((srate, channels), (24000, 1))
+                    self.assertEqual(r.tell(), r.samples)
+                self.assertEqual(r.seek(-5), 0)
+                self.assertEqual(r.read(0, 0)[0].shape, (0, 2))
+
+if __name__ == '__main__':
+    unittest.main()